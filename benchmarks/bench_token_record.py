@@ -0,0 +1,124 @@
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+
+from token_record import TokenRecord, minify_token_data, safe_float
+
+# --- SO SÁNH: dict dài + minify_token_data (cũ) vs TokenRecord.to_wire (mới) ---
+# Chạy: python benchmarks/bench_token_record.py [200 1000 5000]
+
+
+def make_ticker(n, seed=42):
+    rnd = random.Random(seed)
+    items = []
+    for i in range(n):
+        items.append({
+            "alphaId": f"ALPHA_{i}", "symbol": f"TK{i}", "name": f"Token {i}",
+            "iconUrl": f"https://bin.bnbstatic.com/icon/{i}.png", "chainName": rnd.choice(["BSC", "Solana", "Base"]),
+            "chainIconUrl": "https://bin.bnbstatic.com/chain.png", "contractAddress": f"0x{i:040x}",
+            "offline": rnd.random() < 0.1, "listingCex": rnd.random() < 0.05,
+            "onlineTge": rnd.random() < 0.2, "onlineAirdrop": rnd.random() < 0.2,
+            "mulPoint": str(rnd.choice([1, 1, 1, 2, 4])), "listingTime": 1700000000000 + i,
+            "count24h": str(rnd.randint(0, 100000)), "price": f"{rnd.random():.8f}",
+            "percentChange24h": f"{rnd.uniform(-50, 50):.2f}", "liquidity": f"{rnd.uniform(0, 1e7):.2f}",
+            "marketCap": f"{rnd.uniform(0, 1e9):.2f}", "holders": str(rnd.randint(0, 500000)),
+            "volume24h": f"{rnd.uniform(0, 1e8):.2f}"
+        })
+    return items
+
+
+def make_details(item, rnd):
+    vol = safe_float(item.get("volume24h"))
+    limit = vol * rnd.random()
+    chart = [{"p": rnd.random(), "v": rnd.uniform(0, 1e6)} for _ in range(30)]
+    return "ALPHA", vol, vol, limit, vol - limit, chart
+
+
+def legacy_token_dict(item, status, vol_rolling, daily_total, daily_limit, daily_onchain, chart_data):
+    # Bản sao dict mà process_single_token trả về trước khi có TokenRecord
+    return {
+        "id": item.get("alphaId"), "symbol": item.get("symbol"), "name": item.get("name"),
+        "icon": item.get("iconUrl"), "chain": item.get("chainName", ""),
+        "chain_icon": item.get("chainIconUrl"), "contract": item.get("contractAddress"),
+        "offline": item.get("offline", False), "listingCex": item.get("listingCex", False), "status": status,
+        "onlineTge": item.get("onlineTge", False),
+        "onlineAirdrop": item.get("onlineAirdrop", False),
+        "mul_point": safe_float(item.get("mulPoint")),
+        "listing_time": item.get("listingTime", 0),
+        "tx_count": safe_float(item.get("count24h")),
+        "price": safe_float(item.get("price")),
+        "change_24h": safe_float(item.get("percentChange24h")),
+        "liquidity": safe_float(item.get("liquidity")),
+        "market_cap": safe_float(item.get("marketCap")),
+        "holders": safe_float(item.get("holders")),
+        "volume": {
+            "rolling_24h": vol_rolling, "daily_total": daily_total,
+            "daily_limit": daily_limit, "daily_onchain": daily_onchain
+        },
+        "chart": chart_data
+    }
+
+
+def run_legacy(items, details):
+    results = [legacy_token_dict(it, *d) for it, d in zip(items, details)]
+    results.sort(key=lambda x: x["volume"]["daily_total"], reverse=True)
+    minified = [minify_token_data(t) for t in results]
+    return json.dumps({"data": minified}, ensure_ascii=False, separators=(',', ':'))
+
+
+def run_record(items, details):
+    results = [TokenRecord.from_ticker(it, *d) for it, d in zip(items, details)]
+    results.sort(key=TokenRecord.sort_key, reverse=True)
+    minified = [minify_token_data(t) for t in results]
+    return json.dumps({"data": minified}, ensure_ascii=False, separators=(',', ':'))
+
+
+def measure(fn, *args, repeat=3):
+    # Thời gian đo riêng (không bật tracemalloc vì nó làm chậm mọi cấp phát)
+    elapsed = min(_timed(fn, *args) for _ in range(repeat))
+    tracemalloc.start()
+    out = fn(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return out, elapsed, peak
+
+
+def _timed(fn, *args):
+    t0 = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - t0
+
+
+def retained_size(build, items, details):
+    # RAM giữ lại cho list kết quả trong lúc quét token (trước bước minify)
+    tracemalloc.start()
+    results = [build(it, *d) for it, d in zip(items, details)]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del results
+    return size
+
+
+def main(sizes):
+    print(f"{'tokens':>7} | {'legacy ms':>9} | {'record ms':>9} | {'legacy peak':>11} | {'record peak':>11} | {'legacy kept':>11} | {'record kept':>11}")
+    for n in sizes:
+        items = make_ticker(n)
+        rnd = random.Random(n)
+        details = [make_details(it, rnd) for it in items]
+
+        out_legacy, t_legacy, p_legacy = measure(run_legacy, items, details)
+        out_record, t_record, p_record = measure(run_record, items, details)
+        assert out_legacy == out_record, "TokenRecord phải ra đúng JSON như đường cũ"
+
+        k_legacy = retained_size(legacy_token_dict, items, details)
+        k_record = retained_size(TokenRecord.from_ticker, items, details)
+        print(f"{n:>7} | {t_legacy*1000:>9.1f} | {t_record*1000:>9.1f} | {p_legacy/1024:>9.0f}KB | {p_record/1024:>9.0f}KB | {k_legacy/1024:>9.0f}KB | {k_record/1024:>9.0f}KB")
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [200, 1000, 5000])
@@ -0,0 +1,116 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+from stubs import (
+    AGG_KLINES_URL, TICKER_URL, BinanceReplay, DirectSink, Fixtures, ProxyWorkerStub,
+    S3Stub, SupabaseStub, make_tournaments
+)
+
+# --- BENCHMARK OFFLINE CHO CÁC JOB ---
+# Chạy job thật (subprocess) trỏ vào Binance/proxy/R2/Supabase giả lập trên 127.0.0.1.
+#   python benchmarks/run_offline.py --tokens 200 1000 5000 --latency 0.01 --error-rate 0.02 --rate-limit-rate 0.01
+# Báo cáo: thời gian end-to-end, số request, byte truyền, peak RSS của từng kịch bản.
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+JOBS = {
+    "alpha": "scripts/fetch_alpha.py",
+    "competition": "scripts/fetch_competition.py",
+    "base": "scripts/fetch_base_data.py",
+}
+BUCKET = "bench"
+
+
+def job_env(proxy, s3, supabase, sink, lane_rps=0):
+    env = dict(os.environ)
+    env.update({
+        "PROXY_WORKER_URL": proxy.url, "PROXY_WORKER_URLS": "",
+        "BINANCE_INTERNAL_AGG_API": TICKER_URL, "BINANCE_INTERNAL_KLINES_API": AGG_KLINES_URL,
+        "R2_ENDPOINT_URL": s3.url, "R2_BUCKET_NAME": BUCKET,
+        "R2_ACCESS_KEY_ID": "bench", "R2_SECRET_ACCESS_KEY": "bench", "AWS_DEFAULT_REGION": "auto",
+        "AWS_REQUEST_CHECKSUM_CALCULATION": "when_required",
+        "AWS_RESPONSE_CHECKSUM_VALIDATION": "when_required",
+        "SUPABASE_URL": supabase.url, "SUPABASE_SERVICE_ROLE_KEY": "bench.bench.bench",
+        # Gọi thẳng Binance (fallback) đi qua sink -> bị chặn và được đếm, không ra Internet
+        "HTTPS_PROXY": sink.url, "HTTP_PROXY": sink.url, "NO_PROXY": "127.0.0.1,localhost",
+        "ALPHA_TOKEN_DELAY": "0", "COMPETITION_TOKEN_DELAY": "0",
+        # Mặc định tắt lane ưu tiên để đo thông lượng thô; --lane-rps để đo cả giới hạn
+        "PROXY_LANE_RPS": str(lane_rps),
+        "PYTHONUNBUFFERED": "1",
+    })
+    return env
+
+
+def run_job(script, env, log):
+    start = time.time()
+    proc = subprocess.Popen([sys.executable, os.path.join(ROOT, script)], env=env, cwd=ROOT,
+                            stdout=log, stderr=subprocess.STDOUT)
+    _, status, rusage = os.wait4(proc.pid, 0)
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    return {
+        "exit_code": proc.returncode,
+        "seconds": round(time.time() - start, 2),
+        "peak_rss_mb": round(rusage.ru_maxrss / 1024, 1),  # Linux: KB
+    }
+
+
+def run_scenario(job, n_tokens, args):
+    fixtures = Fixtures(n_tokens, args.fixtures)
+    replay = BinanceReplay(fixtures, args.latency, args.error_rate, args.rate_limit_rate)
+    proxy, s3, sink = ProxyWorkerStub(replay), S3Stub(), DirectSink()
+    supabase = SupabaseStub(make_tournaments(fixtures, max(n_tokens // args.tokens_per_tournament, 1)))
+    try:
+        log_path = os.path.join(args.log_dir, f"{job}-{n_tokens}.log")
+        with open(log_path, "w") as log:
+            result = run_job(JOBS[job], job_env(proxy, s3, supabase, sink, args.lane_rps), log)
+        result.update({
+            "job": job, "tokens": n_tokens, "log": log_path,
+            "upstream": replay.counter.stats(), "direct": sink.counter.stats(),
+            "r2": s3.counter.stats(), "supabase": supabase.counter.stats(),
+            "r2_objects": {k: len(v["data"]) for k, v in s3.objects.items()},
+        })
+        return result
+    finally:
+        for server in (proxy, s3, sink, supabase): server.close()
+
+
+def print_table(results):
+    print(f"{'job':<12} {'tokens':>6} {'exit':>4} {'sec':>8} {'rss MB':>7} {'upstream':>8} {'direct':>6} {'proxy MB':>8} {'R2 req':>6} {'R2 up MB':>8}")
+    for r in results:
+        up, r2 = r["upstream"], r["r2"]
+        print(f"{r['job']:<12} {r['tokens']:>6} {r['exit_code']:>4} {r['seconds']:>8.1f} {r['peak_rss_mb']:>7.1f} "
+              f"{up['total']:>8} {r['direct']['total']:>6} {up['bytes_out']/1e6:>8.2f} {r2['total']:>6} {r2['bytes_in']/1e6:>8.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark of the fetch jobs against local stand-ins")
+    parser.add_argument("--tokens", type=int, nargs="+", default=[200, 1000, 5000])
+    parser.add_argument("--jobs", nargs="+", choices=sorted(JOBS), default=["alpha", "competition", "base"])
+    parser.add_argument("--latency", type=float, default=0.0, help="giây trễ cho mỗi request upstream")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="tỉ lệ trả 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="tỉ lệ trả 429")
+    parser.add_argument("--lane-rps", type=float, default=0.0, help="PROXY_LANE_RPS cho job (0 = tắt lane ưu tiên)")
+    parser.add_argument("--tokens-per-tournament", type=int, default=20)
+    parser.add_argument("--fixtures", help="thư mục fixture ghi sẵn (ticker.json, exchangeInfo.json, agg-klines-5m.json...)")
+    parser.add_argument("--log-dir", default=os.path.join(ROOT, "bench-logs"))
+    parser.add_argument("--json", help="ghi toàn bộ kết quả ra file JSON")
+    args = parser.parse_args()
+
+    os.makedirs(args.log_dir, exist_ok=True)
+    results = []
+    for n in args.tokens:
+        for job in args.jobs:
+            print(f"▶ {job} @ {n} tokens...", flush=True)
+            results.append(run_scenario(job, n, args))
+
+    print_table(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
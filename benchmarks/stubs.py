@@ -0,0 +1,379 @@
+import json
+import os
+import random
+import sys
+import threading
+import time
+import urllib.parse
+from datetime import datetime, timedelta
+from email.utils import formatdate
+from hashlib import md5
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+
+import proxy_worker_stub
+
+# --- STAND-IN LOCAL CHO BINANCE / PROXY WORKER / R2 / SUPABASE ---
+# Không gọi mạng thật: Binance được "phát lại" từ fixture (ghi sẵn hoặc tự sinh),
+# proxy worker là proxy_worker_stub với upstream = bộ phát lại, R2 là một S3 tối giản trong RAM.
+
+TICKER_URL = "https://www.binance.com/bapi/defi/v1/public/wallet-direct/buw/wallet/cex/alpha/all/token/list"
+AGG_KLINES_URL = "https://www.binance.com/bapi/defi/v1/public/alpha-trade/agg-klines"
+INTERVAL_MS = {"5m": 300_000, "1h": 3_600_000, "1d": 86_400_000}
+
+
+class Counter:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = {}
+        self.status = {}
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def add(self, kind, status, bytes_out, bytes_in=0):
+        with self._lock:
+            self.requests[kind] = self.requests.get(kind, 0) + 1
+            self.status[status] = self.status.get(status, 0) + 1
+            self.bytes_out += bytes_out
+            self.bytes_in += bytes_in
+
+    def stats(self):
+        return {
+            "requests": dict(self.requests), "total": sum(self.requests.values()),
+            "status": {str(k): v for k, v in self.status.items()},
+            "bytes_in": self.bytes_in, "bytes_out": self.bytes_out
+        }
+
+
+class _Server:
+    def __init__(self, handler):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+# --- FIXTURE BINANCE ---
+class Fixtures:
+    """ Sinh dữ liệu giống Binance cho n token. Nếu có thư mục fixture ghi sẵn thì dùng:
+        ticker.json, exchangeInfo.json, agg-klines-1d.json, agg-klines-5m.json, alpha-klines-1h.json """
+
+    def __init__(self, n_tokens, fixtures_dir=None, seed=7):
+        self.n = n_tokens
+        self.rnd = random.Random(seed)
+        self.recorded = {}
+        if fixtures_dir:
+            for name in os.listdir(fixtures_dir):
+                if name.endswith(".json"):
+                    with open(os.path.join(fixtures_dir, name), "rb") as f:
+                        self.recorded[name[:-5]] = f.read()
+        self.tokens = self._tokens()
+        self._templates = {}
+        self._lock = threading.Lock()
+
+    def _tokens(self):
+        if "ticker" in self.recorded:
+            base = json.loads(self.recorded["ticker"]).get("data") or []
+        else:
+            base = []
+        out = []
+        for i in range(self.n):
+            if base:
+                t = dict(base[i % len(base)])
+                if i >= len(base):
+                    t["alphaId"] = f"ALPHA_{i}"
+                    t["contractAddress"] = f"0x{i:040x}"
+                out.append(t)
+                continue
+            offline = self.rnd.random() < 0.08
+            out.append({
+                "alphaId": f"ALPHA_{i}", "symbol": f"TK{i}", "name": f"Token {i}",
+                "iconUrl": f"https://bin.bnbstatic.com/image/admin_mgs_image_upload/{i}.png",
+                "chainId": self.rnd.choice(["56", "56", "8453", "CT_501"]),
+                "chainName": "BSC", "chainIconUrl": "https://bin.bnbstatic.com/chain/bsc.png",
+                "contractAddress": f"0x{i:040x}", "offline": offline,
+                "listingCex": offline and self.rnd.random() < 0.5,
+                "onlineTge": self.rnd.random() < 0.1, "onlineAirdrop": self.rnd.random() < 0.1,
+                "mulPoint": str(self.rnd.choice([1, 1, 1, 2, 4])), "listingTime": 1700000000000 + i * 1000,
+                "count24h": str(self.rnd.randint(0, 90000)), "price": f"{self.rnd.random():.8f}",
+                "percentChange24h": f"{self.rnd.uniform(-40, 40):.2f}",
+                "liquidity": f"{self.rnd.uniform(1e4, 1e7):.2f}", "marketCap": f"{self.rnd.uniform(1e5, 1e9):.2f}",
+                "holders": str(self.rnd.randint(10, 300000)),
+                "volume24h": f"{self.rnd.uniform(0, 5e7):.2f}" if self.rnd.random() > 0.05 else "0"
+            })
+        return out
+
+    def ticker(self):
+        return json.dumps({"code": "000000", "data": self.tokens}).encode("utf-8")
+
+    def exchange_info(self):
+        if "exchangeInfo" in self.recorded: return self.recorded["exchangeInfo"]
+        symbols = []
+        for i, t in enumerate(self.tokens):
+            if not t.get("listingCex") and i % 3: continue
+            symbols.append({
+                "symbol": f"{t['symbol']}USDT", "status": "TRADING", "baseAsset": t["symbol"], "quoteAsset": "USDT",
+                "orderTypes": ["LIMIT", "LIMIT_MAKER", "MARKET", "STOP_LOSS_LIMIT", "TAKE_PROFIT_LIMIT"],
+                "filters": [
+                    {"filterType": "PRICE_FILTER", "minPrice": "0.00000100", "maxPrice": "1000.00000000", "tickSize": "0.00000100"},
+                    {"filterType": "LOT_SIZE", "minQty": "0.10000000", "maxQty": "9222449.00000000", "stepSize": "0.10000000"},
+                    {"filterType": "NOTIONAL", "minNotional": "5.00000000", "applyMinToMarket": True}
+                ],
+                "permissionSets": [["SPOT", "MARGIN", "TRD_GRP_004", "TRD_GRP_005", "TRD_GRP_006"]]
+            })
+        return json.dumps({"timezone": "UTC", "serverTime": int(time.time() * 1000), "symbols": symbols}).encode("utf-8")
+
+    def klines(self, kind, interval, limit):
+        key = (kind, interval, limit)
+        with self._lock:
+            if key in self._templates: return self._templates[key]
+        recorded = self.recorded.get(f"{kind}-{interval}")
+        if recorded:
+            body = recorded
+        else:
+            step = INTERVAL_MS.get(interval, INTERVAL_MS["1d"])
+            end = int(time.time() * 1000) // step * step
+            rows = []
+            for j in range(limit):
+                ts = end - (limit - 1 - j) * step
+                o = 0.5 + self.rnd.random()
+                v = self.rnd.uniform(1e3, 1e6)
+                rows.append([str(ts), f"{o:.8f}", f"{o*1.03:.8f}", f"{o*0.98:.8f}", f"{o*1.01:.8f}",
+                             f"{v:.2f}", str(ts + step - 1), f"{v*0.6:.2f}", str(self.rnd.randint(1, 5000))])
+            payload = {"code": "000000", "data": rows if kind == "alpha-klines" else {"klineInfos": rows}}
+            body = json.dumps(payload).encode("utf-8")
+        with self._lock:
+            self._templates[key] = body
+        return body
+
+
+class BinanceReplay:
+    """ Upstream cho proxy_worker_stub: trả fixture theo path, có trễ / lỗi 5xx / 429 giả lập. """
+
+    def __init__(self, fixtures, latency=0.0, error_rate=0.0, rate_limit_rate=0.0, seed=11):
+        self.fixtures = fixtures
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.counter = Counter()
+        self._rnd = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def __call__(self, url):
+        parsed = urllib.parse.urlparse(url)
+        query = dict(urllib.parse.parse_qsl(parsed.query))
+        if "agg-klines" in parsed.path: kind = "agg-klines"
+        elif "alpha-trade/klines" in parsed.path: kind = "alpha-klines"
+        elif "exchangeInfo" in parsed.path: kind = "exchangeInfo"
+        else: kind = "ticker"
+
+        if self.latency: time.sleep(self.latency)
+        with self._lock:
+            roll = self._rnd.random()
+        if roll < self.rate_limit_rate:
+            status, body = 429, b'{"code":-1003,"msg":"Too many requests"}'
+        elif roll < self.rate_limit_rate + self.error_rate:
+            status, body = 500, b'{"code":"999999","msg":"Internal error"}'
+        elif kind == "ticker":
+            status, body = 200, self.fixtures.ticker()
+        elif kind == "exchangeInfo":
+            status, body = 200, self.fixtures.exchange_info()
+        else:
+            status, body = 200, self.fixtures.klines(kind, query.get("interval", "1d"), int(query.get("limit", 30)))
+        self.counter.add(kind, status, len(body))
+        return status, body
+
+
+class ProxyWorkerStub(_Server):
+    def __init__(self, replay):
+        self.replay = replay
+        super().__init__(proxy_worker_stub.make_handler(replay))
+
+
+class DirectSink(_Server):
+    """ Đặt làm HTTPS_PROXY: mọi request gọi thẳng Binance bị chặn 403 (giống runner bị geo-block) và được đếm. """
+
+    def __init__(self):
+        counter = self.counter = Counter()
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_CONNECT(self):
+                counter.add("direct", 403, 0)
+                self.send_response(403)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            do_GET = do_POST = do_CONNECT
+
+            def log_message(self, format, *args):
+                pass
+
+        super().__init__(Handler)
+
+
+# --- S3 TỐI GIẢN (đủ cho put/get/head/copy/multipart của boto3) ---
+def _decode_aws_chunked(raw):
+    out, pos = bytearray(), 0
+    while pos < len(raw):
+        eol = raw.index(b"\r\n", pos)
+        size = int(raw[pos:eol].split(b";")[0], 16)
+        if size == 0: break
+        out += raw[eol + 2:eol + 2 + size]
+        pos = eol + 2 + size + 2
+    return bytes(out)
+
+
+class S3Stub(_Server):
+    def __init__(self):
+        objects = self.objects = {}
+        uploads = {}
+        counter = self.counter = Counter()
+        lock = threading.Lock()
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _reply(self, status, body=b"", headers=None):
+                self.send_response(status)
+                for k, v in (headers or {}).items(): self.send_header(k, v)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                if self.command != "HEAD": self.wfile.write(body)
+
+            def _target(self):
+                parsed = urllib.parse.urlparse(self.path)
+                bucket, _, key = parsed.path.lstrip("/").partition("/")
+                return urllib.parse.unquote(key), dict(urllib.parse.parse_qsl(parsed.query, keep_blank_values=True))
+
+            def _body(self):
+                raw = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                if "aws-chunked" in (self.headers.get("Content-Encoding") or "") or self.headers.get("x-amz-decoded-content-length"):
+                    raw = _decode_aws_chunked(raw)
+                return raw
+
+            def _meta(self, obj):
+                return {"ETag": f'"{obj["etag"]}"', "Last-Modified": formatdate(obj["mtime"], usegmt=True),
+                        "Content-Type": obj["content_type"]}
+
+            def _not_found(self):
+                body = b"" if self.command == "HEAD" else b"<?xml version='1.0' encoding='UTF-8'?><Error><Code>NoSuchKey</Code><Message>Not found</Message></Error>"
+                self._reply(404, body, {"Content-Type": "application/xml"})
+
+            def _store(self, key, data, content_type):
+                obj = {"data": data, "etag": md5(data).hexdigest(), "mtime": time.time(), "content_type": content_type}
+                with lock: objects[key] = obj
+                return obj
+
+            def do_PUT(self):
+                key, query = self._target()
+                data = self._body()
+                if "uploadId" in query:
+                    with lock: uploads[query["uploadId"]][int(query["partNumber"])] = data
+                    counter.add("upload_part", 200, 0, len(data))
+                    return self._reply(200, b"", {"ETag": f'"{md5(data).hexdigest()}"'})
+                source = self.headers.get("x-amz-copy-source")
+                if source:
+                    src_key = urllib.parse.unquote(source).lstrip("/").partition("/")[2]
+                    src = objects.get(src_key)
+                    if not src: return self._not_found()
+                    obj = self._store(key, src["data"], src["content_type"])
+                    counter.add("copy", 200, 0)
+                    body = f"<CopyObjectResult><ETag>\"{obj['etag']}\"</ETag><LastModified>{datetime.utcnow().isoformat()}Z</LastModified></CopyObjectResult>"
+                    return self._reply(200, body.encode("utf-8"), {"Content-Type": "application/xml"})
+                obj = self._store(key, data, self.headers.get("Content-Type") or "binary/octet-stream")
+                counter.add("put", 200, 0, len(data))
+                self._reply(200, b"", {"ETag": f'"{obj["etag"]}"'})
+
+            def do_GET(self):
+                key, _ = self._target()
+                obj = objects.get(key)
+                if not obj:
+                    counter.add("get", 404, 0)
+                    return self._not_found()
+                counter.add("get", 200, len(obj["data"]))
+                self._reply(200, obj["data"], self._meta(obj))
+
+            def do_HEAD(self):
+                key, _ = self._target()
+                obj = objects.get(key)
+                counter.add("head", 200 if obj else 404, 0)
+                if not obj: return self._not_found()
+                self.send_response(200)
+                for k, v in self._meta(obj).items(): self.send_header(k, v)
+                self.send_header("Content-Length", str(len(obj["data"])))
+                self.end_headers()
+
+            def do_POST(self):
+                key, query = self._target()
+                self._body()
+                if "uploads" in query:
+                    upload_id = md5(f"{key}{time.time()}".encode()).hexdigest()
+                    with lock: uploads[upload_id] = {}
+                    counter.add("create_multipart", 200, 0)
+                    body = f"<InitiateMultipartUploadResult><Bucket>b</Bucket><Key>{key}</Key><UploadId>{upload_id}</UploadId></InitiateMultipartUploadResult>"
+                    return self._reply(200, body.encode("utf-8"), {"Content-Type": "application/xml"})
+                if "uploadId" in query:
+                    with lock: parts = uploads.pop(query["uploadId"], {})
+                    obj = self._store(key, b"".join(parts[n] for n in sorted(parts)), "application/json")
+                    counter.add("complete_multipart", 200, 0)
+                    body = f"<CompleteMultipartUploadResult><Key>{key}</Key><ETag>\"{obj['etag']}\"</ETag></CompleteMultipartUploadResult>"
+                    return self._reply(200, body.encode("utf-8"), {"Content-Type": "application/xml"})
+                self._reply(400)
+
+            def do_DELETE(self):
+                key, query = self._target()
+                with lock:
+                    if "uploadId" in query: uploads.pop(query["uploadId"], None)
+                    else: objects.pop(key, None)
+                self._reply(204)
+
+            def log_message(self, format, *args):
+                pass
+
+        super().__init__(Handler)
+
+
+# --- SUPABASE REST GIẢ ---
+def make_tournaments(fixtures, count):
+    today = datetime.utcnow()
+    rows = []
+    for i, t in enumerate(fixtures.tokens[:count]):
+        rows.append({
+            "id": i + 1, "name": t["symbol"], "contract": t["contractAddress"],
+            "data": {
+                "name": t["symbol"], "alphaId": t["alphaId"], "chainId": 56,
+                "contract": t["contractAddress"], "contractAddress": t["contractAddress"],
+                "start": (today - timedelta(days=10)).strftime("%Y-%m-%d"), "startTime": "00:00",
+                "end": (today + timedelta(days=5)).strftime("%Y-%m-%d"), "endTime": "23:59",
+                "quoteAsset": "USDT", "iconUrl": t.get("iconUrl"), "chainIconUrl": t.get("chainIconUrl")
+            }
+        })
+    return rows
+
+
+class SupabaseStub(_Server):
+    def __init__(self, rows):
+        counter = self.counter = Counter()
+        body = json.dumps(rows).encode("utf-8")
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                status, payload = (200, body) if self.path.startswith("/rest/v1/tournaments") else (404, b"[]")
+                counter.add("rest", status, len(payload))
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        super().__init__(Handler)
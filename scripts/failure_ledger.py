@@ -0,0 +1,96 @@
+import json
+import os
+import time
+
+# --- SỔ THEO DÕI TOKEN HỎNG (NEGATIVE CACHE) ---
+# Token có kline timeout / rỗng liên tục sẽ bị cách ly với backoff lũy thừa:
+# lần hỏng thứ QUARANTINE_AFTER -> nghỉ BASE_BACKOFF, mỗi lần hỏng tiếp theo x2, tối đa MAX_BACKOFF.
+# Đến next_probe thì được thử lại 1 lần; thành công là xóa khỏi sổ.
+# Lỗi chỉ được ghi sổ khi flush() cuối mỗi đợt: nếu quá OUTAGE_RATIO số token hỏng cùng lúc thì đó là
+# proxy / upstream sập chứ không phải token chết -> bỏ qua cả đợt. Tối đa MAX_QUARANTINED token bị cách ly.
+LEDGER_KEY = "cache/failure-ledger.json"
+QUARANTINE_AFTER = 2
+BASE_BACKOFF = 30 * 60
+MAX_BACKOFF = 7 * 86400
+OUTAGE_RATIO = 0.5
+OUTAGE_MIN_ATTEMPTS = 10
+MAX_QUARANTINED = int(os.getenv("FAILURE_MAX_QUARANTINED", "100"))
+
+
+def ledger_key(alpha_id, contract):
+    return f"{alpha_id}:{str(contract or '').lower()}"
+
+
+class FailureLedger:
+    def __init__(self, entries=None):
+        self.entries = entries or {}
+        self.dirty = False
+        self.pending = []  # Lỗi của đợt đang chạy, chờ flush()
+        self.attempts = 0
+
+    @classmethod
+    def load_from_r2(cls, r2_client, bucket, key=LEDGER_KEY):
+        if not r2_client: return cls()
+        try:
+            obj = r2_client.get_object(Bucket=bucket, Key=key)
+            return cls(json.loads(obj['Body'].read().decode('utf-8')))
+        except Exception:
+            return cls()
+
+    def save_to_r2(self, r2_client, bucket, key=LEDGER_KEY):
+        if not r2_client or not self.dirty: return
+        try:
+            r2_client.put_object(
+                Bucket=bucket, Key=key,
+                Body=json.dumps(self.entries, separators=(',', ':')).encode('utf-8'),
+                ContentType='application/json'
+            )
+            self.dirty = False
+        except Exception as e:
+            print(f"⚠️ Không lưu được failure ledger: {e}")
+
+    def should_skip(self, key, now=None):
+        entry = self.entries.get(key)
+        return bool(entry) and entry.get("next_probe", 0) > (now or time.time())
+
+    def record_failure(self, key, reason="", symbol=None):
+        self.attempts += 1
+        self.pending.append((key, reason, symbol))
+
+    def record_success(self, key):
+        self.attempts += 1
+        if self.entries.pop(key, None) is not None:
+            self.dirty = True
+
+    def flush(self, now=None):
+        """ Ghi sổ các lỗi của đợt vừa chạy. Trả về False nếu đợt bị coi là outage (không ghi gì). """
+        pending, attempts = self.pending, self.attempts
+        self.pending, self.attempts = [], 0
+        if attempts >= OUTAGE_MIN_ATTEMPTS and len(pending) > attempts * OUTAGE_RATIO:
+            print(f"⚠️ {len(pending)}/{attempts} token lỗi cùng lúc -> nghi proxy/upstream sập, không ghi failure ledger")
+            return False
+        now = now or time.time()
+        for key, reason, symbol in pending:
+            self._apply_failure(key, reason, symbol, now)
+        return True
+
+    def _apply_failure(self, key, reason, symbol, now):
+        entry = self.entries.setdefault(key, {"fails": 0, "first_failed": int(now), "next_probe": 0})
+        entry["fails"] += 1
+        entry["last_error"] = reason
+        if symbol: entry["symbol"] = symbol
+        # Đủ MAX_QUARANTINED thì chỉ đếm lỗi, token vẫn được thử mỗi lần chạy
+        if entry["fails"] >= QUARANTINE_AFTER and (entry.get("next_probe", 0) > now or self._quarantined_count(now) < MAX_QUARANTINED):
+            backoff = min(BASE_BACKOFF * 2 ** (entry["fails"] - QUARANTINE_AFTER), MAX_BACKOFF)
+            entry["next_probe"] = int(now + backoff)
+        self.dirty = True
+
+    def _quarantined_count(self, now):
+        return sum(1 for v in self.entries.values() if v.get("next_probe", 0) > now)
+
+    def quarantined(self, now=None):
+        now = now or time.time()
+        return sorted(
+            ({"key": k, **v} for k, v in self.entries.items() if v.get("next_probe", 0) > now),
+            key=lambda e: e["next_probe"]
+        )
@@ -1,13 +1,24 @@
 import json
 import os
 import time
-import urllib.parse
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 import requests 
 import cloudscraper
 import boto3 
 from botocore.config import Config
+import fetch_layer
+from fetch_layer import ProxyPool
+from response_cache import ResponseCache
+from json_stream import Projection
+from token_record import KEY_MAP, TokenRecord, minify_token_data
+from run_metrics import METRICS
+import profiling
+from failure_ledger import FailureLedger, ledger_key
+from kline_store import KlineStore, ALPHA_STORE_KEY, COMPETITION_STORE_KEY
+from json_spool import JsonSpool
+from market_index import INDEX_KEY, build_market_index
+from traffic_lanes import TrafficLane
 
 # --- 1. CẤU HÌNH ---
 load_dotenv()
@@ -17,13 +28,27 @@ R2_SECRET_ACCESS_KEY = os.getenv("R2_SECRET_ACCESS_KEY")
 R2_ENDPOINT_URL = os.getenv("R2_ENDPOINT_URL")
 R2_BUCKET_NAME = os.getenv("R2_BUCKET_NAME")
 
-PROXY_WORKER_URL = os.getenv("PROXY_WORKER_URL")
+PROXY_POOL = ProxyPool.from_env()
 API_AGG_TICKER = os.getenv("BINANCE_INTERNAL_AGG_API")
 API_AGG_KLINES = os.getenv("BINANCE_INTERNAL_KLINES_API")
 API_PUBLIC_SPOT = "https://api.binance.com/api/v3/exchangeInfo"
+# Nghỉ giữa các token để không dội proxy (benchmark offline đặt = 0)
+TOKEN_DELAY = float(os.getenv("ALPHA_TOKEN_DELAY", "1.5"))
+
+# Chỉ parse các field thực sự dùng từ những response lớn (exchangeInfo, kline 5m x1000)
+SPOT_FIELDS = Projection(array="symbols", fields=("baseAsset", "status"))
+KLINE_DAILY_FIELDS = Projection(scalars=("code",), array="data.klineInfos", fields=(0, 4, 5))
+KLINE_TAIL_FIELDS = Projection(scalars=("code",), array="data.klineInfos", fields=(0, 5))
 
 ACTIVE_SPOT_SYMBOLS = set()
+RESPONSE_CACHE = None
+SPOT_CONFIRMED = False  # False = set Spot lấy từ cache còn TTL, chưa hỏi upstream trong lần chạy này
 OLD_DATA_MAP = {}
+FAILURE_LEDGER = FailureLedger()
+SHARED_STORE = KlineStore()
+
+class KlineUnavailable(Exception):
+    pass
 
 # --- KHỞI TẠO KẾT NỐI R2 (OBJECT STORAGE) ---
 def get_r2_client():
@@ -49,88 +74,19 @@ session.headers.update({
     "Accept": "application/json"
 })
 
-KEY_MAP = {
-    "id": "i", "symbol": "s", "name": "n", "icon": "ic",
-    "chain": "cn", "chain_icon": "ci", "contract": "ct",
-    "status": "st", "price": "p", "change_24h": "c",
-    "market_cap": "mc", "liquidity": "l", "volume": "v",
-    "holders": "h",
-    "rolling_24h": "r24", "daily_total": "dt",
-    "daily_limit": "dl", "daily_onchain": "do",
-    "chart": "ch", "listing_time": "lt", "tx_count": "tx",
-    "offline": "off", "listingCex": "cex",
-    "onlineTge": "tge",
-    "onlineAirdrop": "air",
-    "mul_point": "mp"
-}
-
-def minify_token_data(token):
-    minified = {}
-    minified[KEY_MAP["id"]] = token.get("id")
-    minified[KEY_MAP["symbol"]] = token.get("symbol")
-    minified[KEY_MAP["name"]] = token.get("name")
-    minified[KEY_MAP["icon"]] = token.get("icon")
-    
-    minified[KEY_MAP["chain"]] = token.get("chain")
-    minified[KEY_MAP["chain_icon"]] = token.get("chain_icon")
-    minified[KEY_MAP["contract"]] = token.get("contract")
-
-    minified[KEY_MAP["status"]] = token.get("status")
-    minified[KEY_MAP["price"]] = token.get("price")
-    minified[KEY_MAP["change_24h"]] = token.get("change_24h")
-    minified[KEY_MAP["mul_point"]] = token.get("mul_point")
-
-    minified[KEY_MAP["market_cap"]] = int(token.get("market_cap", 0))
-    minified[KEY_MAP["holders"]] = int(token.get("holders", 0))
-    minified[KEY_MAP["liquidity"]] = int(token.get("liquidity", 0))
-    minified[KEY_MAP["tx_count"]] = int(token.get("tx_count", 0))
-    
-    minified[KEY_MAP["listing_time"]] = token.get("listing_time")
-    minified[KEY_MAP["offline"]] = 1 if token.get("offline") else 0
-    minified[KEY_MAP["listingCex"]] = 1 if token.get("listingCex") else 0
-    minified[KEY_MAP["onlineTge"]] = 1 if token.get("onlineTge") else 0
-    minified[KEY_MAP["onlineAirdrop"]] = 1 if token.get("onlineAirdrop") else 0
-
-    vol = token.get("volume", {})
-    minified[KEY_MAP["volume"]] = {
-        KEY_MAP["rolling_24h"]: int(vol.get("rolling_24h", 0)),
-        KEY_MAP["daily_total"]: int(vol.get("daily_total", 0)),
-        KEY_MAP["daily_limit"]: int(vol.get("daily_limit", 0)),
-        KEY_MAP["daily_onchain"]: int(vol.get("daily_onchain", 0))
-    }
-    
-    minified[KEY_MAP["chart"]] = token.get("chart", [])
-    
-    return minified
+def is_valid_payload(data):
+    if not isinstance(data, dict): return False
+    return "symbols" in data or data.get("code") == "000000"
 
-def fetch_smart(target_url, retries=3):
-    is_render = "onrender.com" in (PROXY_WORKER_URL or "")
+@profiling.hot("fetch_smart")
+def fetch_smart(target_url, retries=3, projection=None):
     if not target_url or "None" in target_url: return None
+    return fetch_layer.fetch_smart(session, PROXY_POOL, target_url, retries=retries, accept=is_valid_payload, projection=projection)
 
-    for i in range(retries):
-        if PROXY_WORKER_URL:
-            try:
-                encoded_target = urllib.parse.quote(target_url, safe='')
-                proxy_final_url = f"{PROXY_WORKER_URL}?url={encoded_target}"
-                current_timeout = 60 if (is_render and i == 0) else 30
-                res = session.get(proxy_final_url, timeout=current_timeout)
-                if res.status_code == 200:
-                    data = res.json()
-                    if isinstance(data, dict):
-                        if "symbols" in data: return data 
-                        if data.get("code") == "000000": return data
-                elif res.status_code == 502: time.sleep(3)
-            except: pass
-        
-        try:
-            res = session.get(target_url, timeout=15)
-            if res.status_code == 200:
-                data = res.json()
-                if "symbols" in data: return data
-                if data.get("code") == "000000": return data
-        except: pass
-        time.sleep(1)
-    return None
+@profiling.hot("fetch_many")
+def fetch_many(target_urls, retries=3, projection=None):
+    urls = [u if u and "None" not in u else None for u in target_urls]
+    return fetch_layer.fetch_many(session, PROXY_POOL, urls, retries=retries, accept=is_valid_payload, projection=projection)
 
 def safe_float(v):
     try: return float(v) if v else 0.0
@@ -151,17 +107,53 @@ def load_old_data_from_r2(r2_client):
         print(f"⚠️ Không tải được cache từ R2 (Lần đầu chạy?): {e}")
         return {}
 
-def get_active_spot_symbols():
+def get_active_spot_symbols(cache=None, force=False):
+    global SPOT_CONFIRMED
+    SPOT_CONFIRMED = True
     try:
         print("⏳ Check Spot Market...", end=" ", flush=True)
-        data = fetch_smart(API_PUBLIC_SPOT)
+        if cache is None:
+            data = fetch_smart(API_PUBLIC_SPOT, projection=SPOT_FIELDS)
+            validators = {}
+        else:
+            fresh = None if force else cache.get_fresh("spot_symbols")
+            if fresh is not None:
+                SPOT_CONFIRMED = False
+                print(f"OK ({len(fresh)}, cache)")
+                return set(fresh)
+            status, data, validators = fetch_layer.fetch_revalidate(
+                session, PROXY_POOL, API_PUBLIC_SPOT, cache.validators("spot_symbols"),
+                accept=is_valid_payload, projection=SPOT_FIELDS
+            )
+            if status == 304:
+                cache.touch("spot_symbols")
+                res = set(cache.get_stale("spot_symbols"))
+                print(f"OK ({len(res)}, 304)")
+                return res
+            if status is None: data = fetch_smart(API_PUBLIC_SPOT, projection=SPOT_FIELDS)
+
         if data and "symbols" in data:
             res = {s["baseAsset"] for s in data["symbols"] if s["status"] == "TRADING"}
+            if cache is not None: cache.put("spot_symbols", sorted(res), **validators)
             print(f"OK ({len(res)})")
             return res
+
+        # Upstream lỗi: dùng bản cũ còn trong hạn max_stale, tránh đánh nhầm token SPOT thành PRE_DELISTED
+        stale = cache.get_stale("spot_symbols") if cache is not None else None
+        if stale:
+            print(f"STALE ({len(stale)})")
+            return set(stale)
     except: pass
     return set()
 
+def confirm_spot_symbols():
+    # Token offline không có trong set Spot lấy từ cache -> revalidate 1 lần trước khi đánh PRE_DELISTED,
+    # vì DELISTED dính vĩnh viễn qua OLD_DATA_MAP
+    global ACTIVE_SPOT_SYMBOLS
+    if SPOT_CONFIRMED or RESPONSE_CACHE is None: return
+    res = get_active_spot_symbols(RESPONSE_CACHE, force=True)
+    if res: ACTIVE_SPOT_SYMBOLS = res
+
 def fetch_details_optimized(chain_id, contract_addr):
     if not API_AGG_KLINES: return 0, 0, 0, []
     no_lower_chains = ["CT_501", "CT_784"]
@@ -172,15 +164,27 @@ def fetch_details_optimized(chain_id, contract_addr):
     d_total, d_limit = 0.0, 0.0
     chart_data = []
 
+    res_limit, res_agg = fetch_many(
+        [f"{base_url}&dataType=limit", f"{base_url}&dataType=aggregate"], projection=KLINE_DAILY_FIELDS
+    )
+
+    # Token đang có giải -> công bố nến 1d cho fetch_base_data dùng lại
+    if SHARED_STORE.wants(chain_id, contract_addr):
+        for name, res in (("1d:limit", res_limit), ("1d:aggregate", res_agg)):
+            if res and res.get("data") and res["data"].get("klineInfos"):
+                SHARED_STORE.put(chain_id, contract_addr, name, res["data"]["klineInfos"])
+
+    # Cả 2 endpoint đều timeout / rỗng -> coi là token hỏng để ghi vào failure ledger
+    if not any(r and r.get("data") and r["data"].get("klineInfos") for r in (res_limit, res_agg)):
+        raise KlineUnavailable("no kline data")
+
     try:
-        res_limit = fetch_smart(f"{base_url}&dataType=limit")
         if res_limit and res_limit.get("data") and res_limit["data"].get("klineInfos"):
             k_infos = res_limit["data"]["klineInfos"]
             if k_infos: d_limit = safe_float(k_infos[-1][5])
     except: pass
 
     try:
-        res_agg = fetch_smart(f"{base_url}&dataType=aggregate")
         if res_agg and res_agg.get("data") and res_agg["data"].get("klineInfos"):
             k_infos = res_agg["data"]["klineInfos"]
             if k_infos:
@@ -206,6 +210,7 @@ def process_single_token(item):
     status = "ALPHA"
     need_limit_check = False 
     if is_offline:
+        if not is_listing_cex and symbol not in ACTIVE_SPOT_SYMBOLS: confirm_spot_symbols()
         if is_listing_cex or symbol in ACTIVE_SPOT_SYMBOLS: status = "SPOT"
         else:
             status = "PRE_DELISTED"
@@ -220,6 +225,15 @@ def process_single_token(item):
     should_fetch = False
     if vol_rolling > 0 and (status == "ALPHA" or status == "PRE_DELISTED"):
         should_fetch = True
+
+    # Token đang bị cách ly: không tốn retry/proxy cho tới lượt probe kế tiếp.
+    # Cách ly chỉ bỏ request, không được đổi status: token cần check limit (offline) luôn được probe,
+    # nếu không nhánh dưới sẽ biến PRE_DELISTED thành DELISTED vĩnh viễn mà chưa hỏi upstream.
+    failure_id = ledger_key(aid, contract)
+    quarantined = should_fetch and not need_limit_check and FAILURE_LEDGER.should_skip(failure_id)
+    if quarantined:
+        should_fetch = False
+        print(f"⏸️ {symbol} (quarantined)")
     
     daily_total, daily_limit, daily_onchain = 0.0, 0.0, 0.0
     chart_data = []
@@ -240,41 +254,32 @@ def process_single_token(item):
                     print("❌ DEAD")
             else: print("OK")
             if daily_total <= 0: daily_total = vol_rolling
+            FAILURE_LEDGER.record_success(failure_id)
         except Exception as e:
             print(f"⚠️ Err: {e}")
+            FAILURE_LEDGER.record_failure(failure_id, str(e), symbol)
             daily_total = vol_rolling
             if need_limit_check: status = "DELISTED"
     else:
         daily_total = vol_rolling
         if status == "PRE_DELISTED": status = "DELISTED"
         
-        if status == "DELISTED" and OLD_DATA_MAP and aid in OLD_DATA_MAP:
+        if (status == "DELISTED" or quarantined) and OLD_DATA_MAP and aid in OLD_DATA_MAP:
             old_item = OLD_DATA_MAP[aid]
             if old_item.get(KEY_MAP["chart"]):
                 chart_data = old_item.get(KEY_MAP["chart"])
+            # Token cách ly giữ luôn volume ngày của lần cuối lấy được, khớp với chart cũ
+            old_vol = old_item.get(KEY_MAP["volume"]) or {}
+            if quarantined and old_vol:
+                daily_total = safe_float(old_vol.get(KEY_MAP["daily_total"])) or vol_rolling
+                daily_limit = safe_float(old_vol.get(KEY_MAP["daily_limit"]))
+                daily_onchain = safe_float(old_vol.get(KEY_MAP["daily_onchain"]))
+
+    return TokenRecord.from_ticker(
+        item, status, vol_rolling, daily_total, daily_limit, daily_onchain, chart_data
+    )
 
-    return {
-        "id": aid, "symbol": symbol, "name": item.get("name"),
-        "icon": item.get("iconUrl"), "chain": item.get("chainName", ""),
-        "chain_icon": item.get("chainIconUrl"), "contract": contract,
-        "offline": is_offline, "listingCex": is_listing_cex, "status": status,
-        "onlineTge": item.get("onlineTge", False),
-        "onlineAirdrop": item.get("onlineAirdrop", False),
-        "mul_point": safe_float(item.get("mulPoint")),
-        "listing_time": item.get("listingTime", 0),
-        "tx_count": safe_float(item.get("count24h")),
-        "price": safe_float(item.get("price")),
-        "change_24h": safe_float(item.get("percentChange24h")),
-        "liquidity": safe_float(item.get("liquidity")),
-        "market_cap": safe_float(item.get("marketCap")),
-        "holders": safe_float(item.get("holders")),
-        "volume": {
-            "rolling_24h": vol_rolling, "daily_total": daily_total,
-            "daily_limit": daily_limit, "daily_onchain": daily_onchain
-        },
-        "chart": chart_data
-    }
-
+@profiling.hot("build_suffix_sum")
 def build_suffix_sum(klines, yesterday_str):
     arr = [0.0] * 1440
     if not klines: return arr
@@ -313,68 +318,113 @@ def generate_and_upload_tails(r2_client, raw_tokens, results):
         
     print("\n🦊 Bắt đầu quét Cái Đuôi 5m cho toàn thị trường...")
     
-    tails_total, tails_limit = {}, {}
+    # Mảng suffix-sum của từng token ghi thẳng vào spool ngay khi tính xong, không gom dict trong RAM.
+    # Phần "limit" ghi vào spool riêng rồi nối vào cuối lúc upload.
+    spool, limit_spool = JsonSpool(), JsonSpool()
+    spool.begin_object()
+    spool.field("total")
+    spool.begin_object()
+    limit_spool.begin_object()
     
     # 🚀 LỌC SIÊU TỐC: Chỉ lấy ID của những token đang SỐNG từ results để đi cắt Đuôi!
     # Từ bỏ hoàn toàn những token rác/delisted gây treo timeout.
-    alive_aids = {r["id"] for r in results if r.get("status") in ["ALPHA", "PRE_DELISTED"]}
+    alive_aids = {r.id for r in results if r.status in ["ALPHA", "PRE_DELISTED"]}
     valid_tokens = [t for t in raw_tokens if t.get("alphaId") in alive_aids]
     
-    for idx, t in enumerate(valid_tokens):
+    jobs = []
+    skipped = 0
+    for t in valid_tokens:
         aid = t.get("alphaId")
         chain_id = t.get("chainId")
         contract = t.get("contractAddress")
-        symbol = t.get("symbol")
-        
         if not aid or not contract: continue
-        
-        # In ra từng token để bạn thấy code đang phi ầm ầm chứ không hề bị treo
-        print(f"   [{idx+1}/{len(valid_tokens)}] Cắt đuôi {symbol}...", end=" ", flush=True)
-        
+        if FAILURE_LEDGER.should_skip(ledger_key(aid, contract)):
+            skipped += 1
+            continue
+
         clean_addr = str(contract)
         if chain_id not in ["CT_501", "CT_784"]: clean_addr = clean_addr.lower()
-        
         base_url = f"{API_AGG_KLINES}?chainId={chain_id}&interval=5m&limit=1000&tokenAddress={clean_addr}"
-        
+        jobs.append((aid, t.get("symbol"), base_url, ledger_key(aid, contract)))
+    if skipped: print(f"   ⏸️ Bỏ qua {skipped} token đang bị cách ly")
+
+    # Bật PROXY_BATCH thì gom nhiều token vào 1 round-trip, không thì vẫn từng token như cũ
+    chunk_size = max(fetch_layer.BATCH_MAX_URLS // 2, 1) if fetch_layer.BATCH_ENABLED else 1
+
+    for n in range(0, len(jobs), chunk_size):
+        chunk = jobs[n:n + chunk_size]
+        # In ra từng token để bạn thấy code đang phi ầm ầm chứ không hề bị treo
+        label = chunk[0][1] if len(chunk) == 1 else f"{chunk[0][1]}..{chunk[-1][1]}"
+        print(f"   [{n+len(chunk)}/{len(jobs)}] Cắt đuôi {label}...", end=" ", flush=True)
+
         try:
-            res_tot = fetch_smart(f"{base_url}&dataType=aggregate", retries=1)
-            if res_tot and "data" in res_tot and "klineInfos" in res_tot["data"]:
-                tails_total[aid] = build_suffix_sum(res_tot["data"]["klineInfos"], yesterday_str)
-                
-            res_lim = fetch_smart(f"{base_url}&dataType=limit", retries=1)
-            if res_lim and "data" in res_lim and "klineInfos" in res_lim["data"]:
-                tails_limit[aid] = build_suffix_sum(res_lim["data"]["klineInfos"], yesterday_str)
+            urls = []
+            for _, _, base_url, _ in chunk:
+                urls += [f"{base_url}&dataType=aggregate", f"{base_url}&dataType=limit"]
+            responses = fetch_many(urls, retries=1, projection=KLINE_TAIL_FIELDS)
+
+            for idx, (aid, symbol, _, failure_id) in enumerate(chunk):
+                res_tot, res_lim = responses[2 * idx], responses[2 * idx + 1]
+                got = False
+                if res_tot and "data" in res_tot and "klineInfos" in res_tot["data"]:
+                    spool.field(aid, build_suffix_sum(res_tot["data"]["klineInfos"], yesterday_str))
+                    got = True
+                if res_lim and "data" in res_lim and "klineInfos" in res_lim["data"]:
+                    limit_spool.field(aid, build_suffix_sum(res_lim["data"]["klineInfos"], yesterday_str))
+                    got = True
+                if got: FAILURE_LEDGER.record_success(failure_id)
+                else: FAILURE_LEDGER.record_failure(failure_id, "no tail klines", symbol)
             print("OK")
         except: 
             print("SKIP")
             
-        time.sleep(1.5) 
+        time.sleep(TOKEN_DELAY) 
+    FAILURE_LEDGER.flush()
         
     print("☁️ Đang Upload Tails lên R2...")
-    json_str = json.dumps({"total": tails_total, "limit": tails_limit}, separators=(',', ':'))
     try:
-        r2_client.put_object(Bucket=R2_BUCKET_NAME, Key='tails_cache.json', Body=json_str.encode('utf-8'), ContentType='application/json')
+        spool.end_object()
+        spool.field("limit")
+        limit_spool.end_object()
+        spool.append(limit_spool)
+        spool.end_object()
+        size = spool.upload(r2_client, R2_BUCKET_NAME, 'tails_cache.json', ContentType='application/json')
+        METRICS.record_output('tails_cache.json', size)
         print("✅ Đã lưu tails_cache.json thành công!")
     except Exception as e: print(f"❌ Upload Tails Failed: {e}")
+    finally:
+        spool.close()
+        limit_spool.close()
 
 # --- HÀM CHÍNH ---
 def fetch_data():
-    global ACTIVE_SPOT_SYMBOLS, OLD_DATA_MAP
+    global ACTIVE_SPOT_SYMBOLS, RESPONSE_CACHE, OLD_DATA_MAP, FAILURE_LEDGER, SHARED_STORE
     start = time.time()
     
     r2 = get_r2_client()
     if not r2: return
-
-    OLD_DATA_MAP = load_old_data_from_r2(r2)
-    ACTIVE_SPOT_SYMBOLS = get_active_spot_symbols()
+    PROXY_POOL.warm_up(session)
+    PROXY_POOL.lane = TrafficLane("market", "alpha", r2, R2_BUCKET_NAME)
+
+    with METRICS.phase("load_old_data"):
+        OLD_DATA_MAP = load_old_data_from_r2(r2)
+        FAILURE_LEDGER = FailureLedger.load_from_r2(r2, R2_BUCKET_NAME)
+        SHARED_STORE = KlineStore.load_from_r2(r2, R2_BUCKET_NAME, ALPHA_STORE_KEY)
+        SHARED_STORE.wanted = KlineStore.load_from_r2(r2, R2_BUCKET_NAME, COMPETITION_STORE_KEY).wanted
+    with METRICS.phase("spot_check"):
+        RESPONSE_CACHE = ResponseCache.load_from_r2(r2, R2_BUCKET_NAME)
+        ACTIVE_SPOT_SYMBOLS = get_active_spot_symbols(RESPONSE_CACHE)
+        RESPONSE_CACHE.save_to_r2(r2, R2_BUCKET_NAME)
     
     print("⏳ List...", end=" ", flush=True)
-    try: raw_res = fetch_smart(API_AGG_TICKER)
-    except: return
+    with METRICS.phase("ticker"):
+        try: raw_res = fetch_smart(API_AGG_TICKER)
+        except: return
     if not raw_res: return
     
     raw_data = raw_res.get("data", [])
     print(f"Done ({len(raw_data)})")
+    METRICS.set("tokens", len(raw_data))
 
     target_tokens = raw_data
     target_tokens.sort(key=lambda x: safe_float(x.get("volume24h")), reverse=True)
@@ -382,55 +432,97 @@ def fetch_data():
     results = []
     print(f"🚀 Processing {len(target_tokens)} Tokens (R2 Storage Mode)...")
     
-    for t in target_tokens:
-        r = process_single_token(t)
-        if r: results.append(r)
+    with METRICS.phase("token_details"), profiling.snapshot("token_details"):
+        for t in target_tokens:
+            r = process_single_token(t)
+            if r: results.append(r)
+            
+            time.sleep(TOKEN_DELAY) 
+    FAILURE_LEDGER.flush()
+    # Lưu nến 1d ngay, không đợi quét đuôi -> fetch_base_data chạy sau lượt alpha đầu ngày là dùng được
+    SHARED_STORE.save_to_r2(r2, R2_BUCKET_NAME, ALPHA_STORE_KEY)
+    RESPONSE_CACHE.save_to_r2(r2, R2_BUCKET_NAME)  # Nếu có revalidate Spot giữa chừng
         
-        time.sleep(1.5) 
+    results.sort(key=TokenRecord.sort_key, reverse=True)
+
+    spool = JsonSpool(ensure_ascii=False)
+    with METRICS.phase("serialize"), profiling.snapshot("serialize"):
+        print(f"🔒 Minifying...")
+        updated_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        final_output = {
+            "meta": {
+                "u": updated_at,
+                "t": len(results),
+                "c": "WaveAlpha Data"
+            },
+            # Minify + encode từng token ngay khi ghi, không giữ list minified / chuỗi JSON đầy đủ
+            "data": (minify_token_data(t) for t in results)
+        }
         
-    results.sort(key=lambda x: x["volume"]["daily_total"], reverse=True)
-
-    print(f"🔒 Minifying...")
-    minified_results = [minify_token_data(t) for t in results]
-
-    final_output = {
-        "meta": {
-            "u": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "t": len(minified_results),
-            "c": "WaveAlpha Data"
-        },
-        "data": minified_results
-    }
-    
-    json_str = json.dumps(final_output, ensure_ascii=False, separators=(',', ':'))
+        with profiling.timed("json_dumps"):
+            spool.dump_object(final_output)
+        with profiling.timed("market_index"):
+            index_body = json.dumps(build_market_index(results, updated_at), ensure_ascii=False,
+                                    separators=(',', ':')).encode('utf-8')
 
     print("☁️ Uploading to Cloudflare R2...")
-    try:
-        r2.put_object(
-            Bucket=R2_BUCKET_NAME,
-            Key='market-data.json',
-            Body=json_str.encode('utf-8'),
-            ContentType='application/json',
-            CacheControl='max-age=60' 
-        )
-        print("✅ Uploaded market-data.json")
-
-        today_str = datetime.now().strftime("%Y-%m-%d")
-        r2.put_object(
-            Bucket=R2_BUCKET_NAME,
-            Key=f'history/{today_str}.json',
-            Body=json_str.encode('utf-8'),
-            ContentType='application/json'
-        )
-        print(f"✅ Uploaded history/{today_str}.json")
+    with METRICS.phase("upload"), spool:
+        try:
+            size = spool.upload(r2, R2_BUCKET_NAME, 'market-data.json',
+                                ContentType='application/json', CacheControl='max-age=60')
+            METRICS.record_output('market-data.json', size)
+            print("✅ Uploaded market-data.json")
+
+            # Bản history giống hệt -> copy phía server R2, không upload lại lần 2
+            today_str = datetime.now().strftime("%Y-%m-%d")
+            r2.copy_object(
+                Bucket=R2_BUCKET_NAME,
+                Key=f'history/{today_str}.json',
+                CopySource={'Bucket': R2_BUCKET_NAME, 'Key': 'market-data.json'},
+                MetadataDirective='REPLACE',
+                ContentType='application/json'
+            )
+            # Copy phía server: không có byte nào đi qua mạng, ghi riêng để không lẫn với output upload
+            METRICS.set("copied", {f'history/{today_str}.json': size})
+            print(f"✅ Uploaded history/{today_str}.json")
 
-    except Exception as e:
-        print(f"❌ R2 Upload Failed: {e}")
+        except Exception as e:
+            print(f"❌ R2 Upload Failed: {e}")
+
+        # Index lỗi không được kéo theo market-data / history
+        try:
+            r2.put_object(
+                Bucket=R2_BUCKET_NAME,
+                Key=INDEX_KEY,
+                Body=index_body,
+                ContentType='application/json',
+                CacheControl='max-age=60'
+            )
+            METRICS.record_output(INDEX_KEY, len(index_body))
+            print(f"✅ Uploaded {INDEX_KEY}")
+        except Exception as e:
+            print(f"❌ {INDEX_KEY} Upload Failed: {e}")
         
     # Gọi hàm Cắt Đuôi với bộ lọc token Sống (results)
-    generate_and_upload_tails(r2, target_tokens, results)
-
+    # Quét đuôi là backfill -> chuyển xuống lane bulk, nhường proxy cho competition
+    lanes = [PROXY_POOL.lane.close()]
+    PROXY_POOL.lane = TrafficLane("bulk", "alpha-tails", r2, R2_BUCKET_NAME)
+    with METRICS.phase("tails"):
+        generate_and_upload_tails(r2, target_tokens, results)
+    lanes.append(PROXY_POOL.lane.close())
+    METRICS.set("lanes", lanes)
+
+    quarantine = FAILURE_LEDGER.quarantined()
+    METRICS.set("quarantine", [{"key": q["key"], "symbol": q.get("symbol"), "fails": q["fails"],
+                                "next_probe": q["next_probe"]} for q in quarantine])
+    if quarantine:
+        print(f"⏸️ Quarantine ({len(quarantine)}): " + ", ".join(f"{q.get('symbol') or q['key']}x{q['fails']}" for q in quarantine))
+    FAILURE_LEDGER.save_to_r2(r2, R2_BUCKET_NAME)
+
+    PROXY_POOL.summary()
     print(f"🏁 DONE! Total: {time.time()-start:.1f}s")
 
 if __name__ == "__main__":
-    fetch_data()
+    METRICS.start("alpha")
+    try: profiling.run(fetch_data, "alpha")
+    finally: METRICS.emit(get_r2_client(), R2_BUCKET_NAME)
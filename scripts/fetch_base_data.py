@@ -1,12 +1,18 @@
 import os
-import json
 import time
-import urllib.parse
 from datetime import datetime
 import cloudscraper
 import boto3
 from botocore.config import Config
 from supabase import create_client
+import fetch_layer
+from fetch_layer import ProxyPool
+from json_stream import Projection
+from run_metrics import METRICS
+import profiling
+from kline_store import KlineStore, ALPHA_STORE_KEY
+from json_spool import JsonSpool
+from traffic_lanes import TrafficLane
 
 # --- CẤU HÌNH ---
 SUPABASE_URL = os.getenv("SUPABASE_URL")
@@ -16,7 +22,8 @@ R2_ENDPOINT = os.getenv("R2_ENDPOINT_URL")
 R2_ACCESS_KEY_ID = os.getenv("R2_ACCESS_KEY_ID")
 R2_SECRET_ACCESS_KEY = os.getenv("R2_SECRET_ACCESS_KEY")
 R2_BUCKET = os.getenv("R2_BUCKET_NAME")
-PROXY_WORKER_URL = os.getenv("PROXY_WORKER_URL")
+PROXY_POOL = ProxyPool.from_env()
+KLINE_FIELDS = Projection(scalars=("code",), array="data.klineInfos", fields=(0, 5))
 
 if not SUPABASE_URL or not SUPABASE_KEY:
     raise ValueError("❌ LỖI: Thiếu biến môi trường Supabase.")
@@ -32,42 +39,47 @@ session.headers.update({
     "Referer": "https://www.binance.com/en/alpha"
 })
 
-def fetch_smart(target_url, retries=3):
-    is_render = "onrender.com" in (PROXY_WORKER_URL or "")
+@profiling.hot("fetch_smart")
+def fetch_smart(target_url, retries=3, projection=None):
     if not target_url: return None
-    for i in range(retries):
-        if PROXY_WORKER_URL:
-            try:
-                encoded_target = urllib.parse.quote(target_url, safe='')
-                proxy_final_url = f"{PROXY_WORKER_URL}?url={encoded_target}"
-                current_timeout = 60 if (is_render and i == 0) else 30
-                res = session.get(proxy_final_url, timeout=current_timeout)
-                if res.status_code == 200:
-                    return res.json()
-            except: pass
-        try:
-            res = session.get(target_url, timeout=15)
-            if res.status_code == 200: return res.json()
-        except: pass
-        time.sleep(1)
-    return None
+    return fetch_layer.fetch_smart(session, PROXY_POOL, target_url, retries=retries, projection=projection)
+
+@profiling.hot("fetch_many")
+def fetch_many(target_urls, retries=3, projection=None):
+    return fetch_layer.fetch_many(session, PROXY_POOL, target_urls, retries=retries, projection=projection)
 
 # [ĐÃ SỬA]: Tra bằng chain_id và contract thay vì alpha_id
-def fetch_binance_history(chain_id, contract, start_ts):
+def stored_klines(store, chain_id, contract, name, start_ts, today_start_ts):
+    """ Nến 1d do fetch_alpha công bố trong hôm nay, chỉ dùng nếu phủ được từ start_ts """
+    if store is None: return None
+    rows, _ = store.get(chain_id, contract, name, fresh_since=today_start_ts)
+    if not rows or int(rows[0][0]) > start_ts: return None
+    return {"code": "000000", "data": {"klineInfos": rows}}
+
+def fetch_binance_history(chain_id, contract, start_ts, store=None):
     """ Lấy volume klines 1 ngày từ Start Date đến Hết ngày hôm qua """
     try:
+        today_start_ts = int(datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0).timestamp() * 1000)
+
+        # Ưu tiên nến alpha job đã lấy hôm nay, thiếu cái nào mới gọi upstream cái đó
+        res_tot = stored_klines(store, chain_id, contract, "1d:aggregate", start_ts, today_start_ts)
+        res_lim = stored_klines(store, chain_id, contract, "1d:limit", start_ts, today_start_ts)
+        METRICS.set("store_hits", METRICS.values.get("store_hits", 0) + (res_tot is not None) + (res_lim is not None))
+
         # 1. Gọi API Total (CEX + On-chain)
         url_tot = f"https://www.binance.com/bapi/defi/v1/public/alpha-trade/agg-klines?chainId={chain_id}&interval=1d&limit=100&tokenAddress={contract}&dataType=aggregate"
-        res_tot = fetch_smart(url_tot)
         
         # 2. Gọi API Limit (Bao trọn USDT + USDC + BNB...)
         url_lim = f"https://www.binance.com/bapi/defi/v1/public/alpha-trade/agg-klines?chainId={chain_id}&interval=1d&limit=100&tokenAddress={contract}&dataType=limit"
-        res_lim = fetch_smart(url_lim)
+        if res_tot is None and res_lim is None:
+            res_tot, res_lim = fetch_many([url_tot, url_lim], projection=KLINE_FIELDS)
+        elif res_tot is None:
+            res_tot = fetch_smart(url_tot, projection=KLINE_FIELDS)
+        elif res_lim is None:
+            res_lim = fetch_smart(url_lim, projection=KLINE_FIELDS)
         
         history_total = []
         history_limit = []
-        
-        today_start_ts = int(datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0).timestamp() * 1000)
 
         # Xử lý Total Volume (Lấy k[5] làm USD)
         if res_tot and res_tot.get("code") == "000000" and res_tot.get("data"):
@@ -94,71 +106,80 @@ def fetch_binance_history(chain_id, contract, start_ts):
 
 def main():
     print(">>> BẮT ĐẦU TẠO BASE DATA CHO NODE.JS (ACTIVE ONLY) <<<")
+    PROXY_POOL.warm_up(session)
+    PROXY_POOL.lane = TrafficLane("bulk", "base_data", s3, R2_BUCKET)
     
     today_str = datetime.utcnow().strftime('%Y-%m-%d')
-    response = supabase.table("tournaments").select("*").neq('id', -1).execute()
+    with METRICS.phase("tournaments"):
+        response = supabase.table("tournaments").select("*").neq('id', -1).execute()
+        shared_store = KlineStore.load_from_r2(s3, R2_BUCKET, ALPHA_STORE_KEY)
     all_recs = response.data
     
     export_data = {}
     count_active = 0
 
-    for t in all_recs:
-        try:
-            meta = t.get("data", {})
-            alpha_id = meta.get("alphaId")
-            if not alpha_id: continue 
+    with METRICS.phase("klines"), profiling.snapshot("klines"):
+        for t in all_recs:
+            try:
+                meta = t.get("data", {})
+                alpha_id = meta.get("alphaId")
+                if not alpha_id: continue 
 
-            is_active = True
-            if meta.get("ai_prediction", {}).get("status_label") == "FINALIZED":
-                is_active = False
-            if meta.get("end") and meta.get("end") < today_str:
-                is_active = False
+                is_active = True
+                if meta.get("ai_prediction", {}).get("status_label") == "FINALIZED":
+                    is_active = False
+                if meta.get("end") and meta.get("end") < today_str:
+                    is_active = False
 
-            if not is_active: continue
+                if not is_active: continue
 
-            print(f"-> Xử lý Base Volume: {meta.get('name')} ({alpha_id})...")
+                print(f"-> Xử lý Base Volume: {meta.get('name')} ({alpha_id})...")
             
-            # [ĐÃ SỬA]: Mapping lại ChainId và Contract cẩn thận
-            contract = meta.get("contract", "").strip().lower()
-            chain_id = meta.get("chainId")
-            if not chain_id and meta.get("chain"):
-                c_str = str(meta.get("chain")).lower().strip()
-                chain_map = {'bsc': 56, 'bnb': 56, 'eth': 1, 'ethereum': 1, 'arb': 42161, 'arbitrum': 42161, 'base': 8453, 'op': 10, 'optimism': 10, 'polygon': 137, 'matic': 137}
-                chain_id = chain_map.get(c_str)
-
-            if not chain_id or not contract:
-                print(f"Bỏ qua {alpha_id} do thiếu chainId hoặc contract")
-                continue
-
-            start_str = meta.get("start")
-            start_time_str = meta.get("startTime", "00:00")
-            if len(start_time_str) == 5: start_time_str += ":00"
-            start_dt = datetime.strptime(f"{start_str}T{start_time_str}Z", "%Y-%m-%dT%H:%M:%SZ")
-            start_ts = int(start_dt.timestamp() * 1000)
-
-            # [ĐÃ SỬA]: Gọi hàm với chain_id và contract
-            hist_total, hist_limit = fetch_binance_history(chain_id, contract, start_ts)
+                # [ĐÃ SỬA]: Mapping lại ChainId và Contract cẩn thận
+                contract = meta.get("contract", "").strip().lower()
+                chain_id = meta.get("chainId")
+                if not chain_id and meta.get("chain"):
+                    c_str = str(meta.get("chain")).lower().strip()
+                    chain_map = {'bsc': 56, 'bnb': 56, 'eth': 1, 'ethereum': 1, 'arb': 42161, 'arbitrum': 42161, 'base': 8453, 'op': 10, 'optimism': 10, 'polygon': 137, 'matic': 137}
+                    chain_id = chain_map.get(c_str)
+
+                if not chain_id or not contract:
+                    print(f"Bỏ qua {alpha_id} do thiếu chainId hoặc contract")
+                    continue
+
+                start_str = meta.get("start")
+                start_time_str = meta.get("startTime", "00:00")
+                if len(start_time_str) == 5: start_time_str += ":00"
+                start_dt = datetime.strptime(f"{start_str}T{start_time_str}Z", "%Y-%m-%dT%H:%M:%SZ")
+                start_ts = int(start_dt.timestamp() * 1000)
+
+                # [ĐÃ SỬA]: Gọi hàm với chain_id và contract
+                hist_total, hist_limit = fetch_binance_history(chain_id, contract, start_ts, shared_store)
             
-            export_data[alpha_id] = {
-                "base_total_vol": sum(item['vol'] for item in hist_total),
-                "base_limit_vol": sum(item['vol'] for item in hist_limit),
-                "history_total": hist_total,
-                "history_limit": hist_limit,
-                "start_ts": start_ts
-            }
-            count_active += 1
+                export_data[alpha_id] = {
+                    "base_total_vol": sum(item['vol'] for item in hist_total),
+                    "base_limit_vol": sum(item['vol'] for item in hist_limit),
+                    "history_total": hist_total,
+                    "history_limit": hist_limit,
+                    "start_ts": start_ts
+                }
+                count_active += 1
             
-        except Exception as e:
-            print(f"Lỗi tại {t.get('name')}: {e}")
-
-    s3.put_object(
-        Bucket=R2_BUCKET,
-        Key='tournaments-base.json',
-        Body=json.dumps(export_data),
-        ContentType='application/json',
-        CacheControl='max-age=60'
-    )
+            except Exception as e:
+                print(f"Lỗi tại {t.get('name')}: {e}")
+
+    METRICS.set("tournaments", count_active)
+    METRICS.set("lanes", [PROXY_POOL.lane.close()])
+    with METRICS.phase("upload"), JsonSpool(separators=(', ', ': ')) as spool:
+        with profiling.timed("json_dumps"):
+            spool.dump_object(export_data)
+        size = spool.upload(s3, R2_BUCKET, 'tournaments-base.json',
+                            ContentType='application/json', CacheControl='max-age=60')
+        METRICS.record_output('tournaments-base.json', size)
+    PROXY_POOL.summary()
     print(f"🎉 HOÀN THÀNH! Đã tạo tournaments-base.json cho {count_active} giải đấu.")
 
 if __name__ == "__main__":
-    main()
+    METRICS.start("base_data")
+    try: profiling.run(main, "base_data")
+    finally: METRICS.emit(s3, R2_BUCKET)
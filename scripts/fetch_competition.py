@@ -1,13 +1,19 @@
 import json
 import os
 import time
-import urllib.parse
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 import cloudscraper
 import boto3
 from botocore.config import Config
 import requests
+import fetch_layer
+from fetch_layer import ProxyPool
+from json_stream import Projection
+from run_metrics import METRICS
+import profiling
+from kline_store import KlineStore, COMPETITION_STORE_KEY, token_key
+from traffic_lanes import TrafficLane
 
 # --- 1. CẤU HÌNH ---
 load_dotenv()
@@ -19,8 +25,14 @@ R2_BUCKET_NAME = os.getenv("R2_BUCKET_NAME")
 
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
-PROXY_WORKER_URL = os.getenv("PROXY_WORKER_URL")
+PROXY_POOL = ProxyPool.from_env()
+
+# Nến 1h: chỉ cần ts, high, low, limit volume (k[7]) và số lệnh (k[8])
+HOURLY_FIELDS = (0, 2, 3, 7, 8)
+ALPHA_KLINE_FIELDS = Projection(scalars=("code",), array="data", fields=HOURLY_FIELDS)
+AGG_KLINE_FIELDS = Projection(scalars=("code",), array="data.klineInfos", fields=HOURLY_FIELDS)
 API_AGG_KLINES = os.getenv("BINANCE_INTERNAL_KLINES_API")
+TOKEN_DELAY = float(os.getenv("COMPETITION_TOKEN_DELAY", "0.5"))
 
 # --- KẾT NỐI R2 ---
 def get_r2_client():
@@ -41,26 +53,10 @@ session.headers.update({
     "Referer": "https://www.binance.com/en/alpha"
 })
 
-def fetch_smart(target_url, retries=3):
-    is_render = "onrender.com" in (PROXY_WORKER_URL or "")
+@profiling.hot("fetch_smart")
+def fetch_smart(target_url, retries=3, projection=None):
     if not target_url: return None
-    for i in range(retries):
-        if PROXY_WORKER_URL:
-            try:
-                encoded_target = urllib.parse.quote(target_url, safe='')
-                proxy_final_url = f"{PROXY_WORKER_URL}?url={encoded_target}"
-                current_timeout = 60 if (is_render and i == 0) else 30
-                res = session.get(proxy_final_url, timeout=current_timeout)
-                if res.status_code == 200:
-                    data = res.json()
-                    if isinstance(data, dict): return data
-            except: pass
-        try:
-            res = session.get(target_url, timeout=15)
-            if res.status_code == 200: return res.json()
-        except: pass
-        time.sleep(1)
-    return None
+    return fetch_layer.fetch_smart(session, PROXY_POOL, target_url, retries=retries, accept=lambda d: isinstance(d, dict), projection=projection)
 
 def safe_float(v):
     try: return float(v) if v else 0.0
@@ -81,7 +77,9 @@ def get_active_tournaments():
     try:
         # Lấy TOÀN BỘ giải đấu, không lọc ID
         url = f"{SUPABASE_URL}/rest/v1/tournaments?select=id,name,contract,data"
+        t0 = time.time()
         res = requests.get(url, headers=headers, timeout=10)
+        METRICS.record_request(url, "direct", res.status_code, time.time() - t0, res.status_code == 200)
         
         if res.status_code != 200:
             print(f"❌ Supabase Error: {res.status_code} - {res.text}")
@@ -154,7 +152,14 @@ def get_active_tournaments():
         print(f"❌ Exception in get_active_tournaments: {e}")
         return []
 
-def fetch_limit_history(token_info):
+def merge_hourly(old_rows, new_rows, limit_hours):
+    """ Gộp nến cũ đã lưu với phần đuôi mới lấy (nến mới ghi đè theo ts), giữ limit_hours giờ gần nhất """
+    merged = {int(k[0]): k for k in old_rows or []}
+    for k in new_rows or []: merged[int(k[0])] = k
+    cutoff = (int(time.time()) // 3600 - limit_hours + 1) * 3600 * 1000
+    return [merged[ts] for ts in sorted(merged) if ts >= cutoff]
+
+def fetch_limit_history(token_info, store=None):
     if not API_AGG_KLINES: return []
     alpha_id = token_info.get("alphaId")
     contract = token_info.get("contract")
@@ -166,13 +171,23 @@ def fetch_limit_history(token_info):
     if c_id_str == "8453" or "base" in c_id_str or "sol" in c_id_str: quote_asset = "USDC"
     
     limit_hours = 168 # 7 ngày
+    # Đã có nến 1h từ lần chạy trước -> chỉ lấy phần đuôi (từ nến cuối đã lưu, nến đó có thể chưa đóng)
+    stored = None
+    if store is not None:
+        stored, _ = store.get(chain_id, contract, "1h:limit")
+    fetch_hours = limit_hours
+    if stored:
+        fetch_hours = min(max(int(time.time() * 1000 - int(stored[-1][0])) // 3600000 + 1, 2), limit_hours)
+
     url = ""
     if alpha_id:
-        url = f"https://www.binance.com/bapi/defi/v1/public/alpha-trade/klines?symbol={alpha_id}{quote_asset}&interval=1h&limit={limit_hours}"
+        url = f"https://www.binance.com/bapi/defi/v1/public/alpha-trade/klines?symbol={alpha_id}{quote_asset}&interval=1h&limit={fetch_hours}"
+        projection = ALPHA_KLINE_FIELDS
     else:
-        url = f"{API_AGG_KLINES}?chainId={chain_id}&interval=1h&limit={limit_hours}&tokenAddress={contract}&dataType=limit"
+        url = f"{API_AGG_KLINES}?chainId={chain_id}&interval=1h&limit={fetch_hours}&tokenAddress={contract}&dataType=limit"
+        projection = AGG_KLINE_FIELDS
 
-    data = fetch_smart(url)
+    data = fetch_smart(url, projection=projection)
     chart_points = []
     k_infos = []
     
@@ -180,6 +195,12 @@ def fetch_limit_history(token_info):
         if isinstance(data["data"], list): k_infos = data["data"]
         elif data["data"].get("klineInfos"): k_infos = data["data"]["klineInfos"]
 
+    if store is not None and (k_infos or stored):
+        fetched = bool(k_infos)
+        k_infos = merge_hourly(stored, k_infos, limit_hours)
+        # Chỉ làm mới ts khi upstream trả nến thật; payload lỗi mà vẫn put thì nến cũ bị "đóng dấu" mới mãi
+        if fetched: store.put(chain_id, contract, "1h:limit", k_infos)
+
     for k in k_infos:
         try:
             ts = int(k[0])
@@ -202,9 +223,19 @@ def main():
     start = time.time()
     r2 = get_r2_client()
     if not r2: return
+    PROXY_POOL.warm_up(session)
+    PROXY_POOL.lane = TrafficLane("realtime", "competition", r2, R2_BUCKET_NAME)
 
     print("⏳ Đang lấy danh sách giải đấu từ Supabase...", end=" ")
-    target_tokens = get_active_tournaments()
+    with METRICS.phase("tournaments"):
+        target_tokens = get_active_tournaments()
+        # Store riêng của job này: nến 1h + danh sách token đang có giải để fetch_alpha công bố ticker / nến 1d
+        store = KlineStore.load_from_r2(r2, R2_BUCKET_NAME, COMPETITION_STORE_KEY)
+        wanted = {token_key(t.get("chainId"), t.get("contract")) for t in target_tokens}
+        if wanted != store.wanted:
+            store.wanted = wanted
+            store.dirty = True
+    METRICS.set("tournaments", len(target_tokens))
     print(f"OK ({len(target_tokens)} giải active)")
     
     if not target_tokens:
@@ -214,34 +245,44 @@ def main():
     history_data = {}
     print(f"🚀 Scanning {len(target_tokens)} active tournaments...")
 
-    for t in target_tokens:
-        print(f"📊 {t['symbol']}...", end=" ", flush=True)
-        points = fetch_limit_history(t)
-        if points:
-            history_data[t["contract"]] = { 
-                "s": t["symbol"], 
-                "q": t["quoteAsset"], 
-                "l": t["logo"],
-                "cl": t["chainLogo"],
-                "e": t.get("end_at"),
-                "h": points 
-            }
-            print(f"OK ({len(points)}h)")
-        else:
-            print("No Data")
-        time.sleep(0.5)
+    with METRICS.phase("klines"), profiling.snapshot("klines"):
+        for t in target_tokens:
+            print(f"📊 {t['symbol']}...", end=" ", flush=True)
+            points = fetch_limit_history(t, store)
+            if points:
+                history_data[t["contract"]] = { 
+                    "s": t["symbol"], 
+                    "q": t["quoteAsset"], 
+                    "l": t["logo"],
+                    "cl": t["chainLogo"],
+                    "e": t.get("end_at"),
+                    "h": points 
+                }
+                print(f"OK ({len(points)}h)")
+            else:
+                print("No Data")
+            time.sleep(TOKEN_DELAY)
 
     final_json = { "updated_at": int(time.time() * 1000), "note": "7 Days Limit", "data": history_data }
     
-    try:
-        r2.put_object(
-            Bucket=R2_BUCKET_NAME, Key='competition-history.json',
-            Body=json.dumps(final_json, separators=(',', ':')).encode('utf-8'),
-            ContentType='application/json', CacheControl='no-cache, no-store, must-revalidate'
-        )
-        print("✅ competition-history.json uploaded!")
-    except Exception as e: print(f"❌ Upload Error: {e}")
+    with METRICS.phase("upload"):
+        try:
+            with profiling.timed("json_dumps"):
+                body = json.dumps(final_json, separators=(',', ':')).encode('utf-8')
+            r2.put_object(
+                Bucket=R2_BUCKET_NAME, Key='competition-history.json',
+                Body=body,
+                ContentType='application/json', CacheControl='no-cache, no-store, must-revalidate'
+            )
+            METRICS.record_output('competition-history.json', len(body))
+            print("✅ competition-history.json uploaded!")
+        except Exception as e: print(f"❌ Upload Error: {e}")
+    store.save_to_r2(r2, R2_BUCKET_NAME, COMPETITION_STORE_KEY)
+    METRICS.set("lanes", [PROXY_POOL.lane.close()])
+    PROXY_POOL.summary()
     print(f"🏁 Done: {time.time()-start:.1f}s")
 
 if __name__ == "__main__":
-    main()
+    METRICS.start("competition")
+    try: profiling.run(main, "competition")
+    finally: METRICS.emit(get_r2_client(), R2_BUCKET_NAME)
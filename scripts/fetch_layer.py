@@ -0,0 +1,366 @@
+import hashlib
+import os
+import random
+import threading
+import time
+import urllib.parse
+from collections import deque
+from concurrent.futures import Future, FIRST_COMPLETED, wait
+from json_stream import decode_response, project
+from run_metrics import METRICS
+
+# --- CẤU HÌNH PROXY POOL ---
+# PROXY_WORKER_URLS: nhiều worker cách nhau bởi dấu phẩy. Nếu không có thì dùng PROXY_WORKER_URL cũ.
+COLD_START_HOSTS = ("onrender.com",)
+PROXY_TIMEOUT = 30
+COLD_START_TIMEOUT = 60  # Render ngủ đông -> lần đầu cần chờ lâu để đánh thức
+DIRECT_TIMEOUT = 15
+LATENCY_EWMA_ALPHA = 0.3
+MIN_WEIGHT = 0.02  # Endpoint yếu vẫn được thử lại thỉnh thoảng để hồi phục điểm
+
+# --- HEDGING: route chính chậm quá phân vị độ trễ -> bắn thêm route phụ, ai xong trước thì lấy ---
+HEDGE_ENABLED = os.getenv("PROXY_HEDGE", "0") == "1"
+HEDGE_PERCENTILE = float(os.getenv("PROXY_HEDGE_PERCENTILE", "0.9"))
+HEDGE_DEFAULT_DELAY = 5.0  # Chưa đủ mẫu độ trễ thì chờ mặc định
+HEDGE_MIN_DELAY = 0.3
+HEDGE_MIN_SAMPLES = 10
+LATENCY_SAMPLES = 200
+
+# --- BATCH: gửi nhiều URL trong 1 round-trip tới worker (POST {"urls": [...]}) ---
+BATCH_ENABLED = os.getenv("PROXY_BATCH", "0") == "1"
+BATCH_MAX_URLS = int(os.getenv("PROXY_BATCH_MAX_URLS", "40"))
+BATCH_TIMEOUT = 60
+
+
+class ProxyEndpoint:
+    def __init__(self, url, index=0):
+        self.url = url
+        # Repo public -> log Actions public: chỉ in số thứ tự + hash ngắn, không bao giờ in URL worker
+        self.label = f"#{index}-{hashlib.sha1(url.encode('utf-8')).hexdigest()[:6]}"
+        self.cold_start = any(h in url for h in COLD_START_HOSTS)
+        self.warm = not self.cold_start
+        self.latency = None  # EWMA (giây) của các lần gọi
+        self.ok = 0
+        self.fail = 0
+        self.batch = None  # None = chưa biết, False = worker cũ không hỗ trợ POST batch
+
+    def success_rate(self):
+        # Làm mượt Laplace để endpoint mới chưa có số liệu không bị loại ngay
+        return (self.ok + 1) / (self.ok + self.fail + 2)
+
+    def weight(self):
+        latency = self.latency if self.latency is not None else 1.0
+        return max(self.success_rate() ** 2 / max(latency, 0.05), MIN_WEIGHT)
+
+    def stats(self):
+        return {
+            "id": self.label, "ok": self.ok, "fail": self.fail,
+            "latency": round(self.latency, 3) if self.latency is not None else None,
+            "warm": self.warm
+        }
+
+
+class HedgeStats:
+    def __init__(self):
+        self.requests = 0
+        self.fired = 0
+        self.won = 0  # Route phụ về trước route chính
+
+    def stats(self):
+        return {"requests": self.requests, "fired": self.fired, "won": self.won}
+
+
+class ProxyPool:
+    def __init__(self, urls):
+        seen = set()
+        self.endpoints = []
+        for u in urls:
+            if u and u not in seen:
+                seen.add(u)
+                self.endpoints.append(ProxyEndpoint(u, len(self.endpoints)))
+        self._lock = threading.Lock()
+        self.samples = deque(maxlen=LATENCY_SAMPLES)  # Độ trễ các lần proxy thành công
+        self.hedge = HedgeStats()
+        self.lane = None  # traffic_lanes.TrafficLane của job, None = không giới hạn
+
+    @classmethod
+    def from_env(cls):
+        raw = os.getenv("PROXY_WORKER_URLS") or os.getenv("PROXY_WORKER_URL") or ""
+        return cls([u.strip() for u in raw.split(",") if u.strip()])
+
+    def __bool__(self):
+        return bool(self.endpoints)
+
+    def pick(self, exclude=()):
+        # Chia tải theo sức khỏe: tỉ lệ thành công cao + độ trễ thấp -> nhận nhiều request hơn
+        with self._lock:
+            candidates = [e for e in self.endpoints if e not in exclude] or self.endpoints
+            if not candidates: return None
+            weights = [e.weight() for e in candidates]
+        return random.choices(candidates, weights=weights, k=1)[0]
+
+    def acquire(self, n=1):
+        # Xin quota lane ưu tiên trước khi gửi qua proxy dùng chung, trả về header X-Priority
+        return self.lane.acquire(n) if self.lane else None
+
+    def timeout_for(self, endpoint):
+        return PROXY_TIMEOUT if endpoint.warm else COLD_START_TIMEOUT
+
+    def report(self, endpoint, ok, latency, responded=True, sample=True):
+        # sample=False: không đưa vào mẫu phân vị của hedge (vd. round-trip batch nhiều URL)
+        with self._lock:
+            if ok: endpoint.ok += 1
+            else: endpoint.fail += 1
+            if responded: endpoint.warm = True
+            if ok and sample: self.samples.append(latency)
+            if endpoint.latency is None: endpoint.latency = latency
+            else: endpoint.latency += LATENCY_EWMA_ALPHA * (latency - endpoint.latency)
+
+    def hedge_delay(self):
+        with self._lock:
+            samples = sorted(self.samples)
+        if len(samples) < HEDGE_MIN_SAMPLES: return HEDGE_DEFAULT_DELAY
+        idx = min(int(len(samples) * HEDGE_PERCENTILE), len(samples) - 1)
+        return max(samples[idx], HEDGE_MIN_DELAY)
+
+    def warm_up(self, session):
+        # Ping nền các host cold-start để chúng thức dậy trong lúc job làm việc khác
+        def ping(endpoint):
+            try:
+                session.get(endpoint.url, timeout=COLD_START_TIMEOUT)
+                endpoint.warm = True
+            except Exception: pass
+
+        for e in self.endpoints:
+            if not e.warm:
+                threading.Thread(target=ping, args=(e,), daemon=True).start()
+
+    def summary(self):
+        endpoints = [e.stats() for e in self.endpoints]
+        for s in endpoints:
+            latency = f"{s['latency']}s" if s['latency'] is not None else "-"
+            print(f"   🛰️ proxy {s['id']}: ok={s['ok']} fail={s['fail']} latency={latency}")
+        h = self.hedge.stats()
+        if HEDGE_ENABLED:
+            print(f"   🦔 Hedge: {h['fired']}/{h['requests']} lần bắn, route phụ thắng {h['won']}")
+        METRICS.set("proxy", {"endpoints": endpoints, "hedge_enabled": HEDGE_ENABLED, "hedge": h})
+
+
+def _accept_any(data):
+    return data is not None
+
+
+def proxy_url(endpoint, target_url):
+    return f"{endpoint.url}?url={urllib.parse.quote(target_url, safe='')}"
+
+
+def fetch_via_proxy(session, pool, endpoint, target_url, accept=_accept_any, projection=None):
+    return _proxy_get(session, pool, endpoint, target_url, accept, projection, pool.acquire())
+
+
+def _proxy_get(session, pool, endpoint, target_url, accept, projection, headers):
+    # Quota lane đã xin xong từ trước -> latency chỉ tính thời gian request thật
+    start = time.time()
+    try:
+        res = session.get(proxy_url(endpoint, target_url), headers=headers, timeout=pool.timeout_for(endpoint), stream=projection is not None)
+    except Exception:
+        pool.report(endpoint, False, time.time() - start, responded=False)
+        METRICS.record_request(target_url, "proxy", "error", time.time() - start, False)
+        return None
+
+    if res.status_code == 200:
+        try:
+            data = decode_response(res, projection)
+            latency = time.time() - start
+            if accept(data):
+                pool.report(endpoint, True, latency)
+                METRICS.record_request(target_url, "proxy", 200, latency, True)
+                return data
+        except Exception: pass
+    else: res.close()
+    pool.report(endpoint, False, time.time() - start)
+    METRICS.record_request(target_url, "proxy", res.status_code, time.time() - start, False)
+    if res.status_code == 502: time.sleep(3)
+    return None
+
+
+def fetch_direct(session, target_url, accept=_accept_any, projection=None):
+    start = time.time()
+    status = "error"
+    try:
+        res = session.get(target_url, timeout=DIRECT_TIMEOUT, stream=projection is not None)
+        status = res.status_code
+        if res.status_code == 200:
+            data = decode_response(res, projection)
+            if accept(data):
+                METRICS.record_request(target_url, "direct", status, time.time() - start, True)
+                return data
+        else: res.close()
+    except Exception: pass
+    METRICS.record_request(target_url, "direct", status, time.time() - start, False)
+    return None
+
+
+def fetch_revalidate(session, pool, target_url, validators=None, accept=_accept_any, projection=None):
+    """ GET có điều kiện (If-None-Match / If-Modified-Since).
+        Trả về (304, None, validators) nếu upstream chưa đổi, (200, data, validators_mới) nếu có body mới,
+        (None, None, {}) nếu mọi route đều lỗi. Worker proxy được kỳ vọng chuyển tiếp header điều kiện. """
+    validators = validators or {}
+    headers = {}
+    if validators.get("etag"): headers["If-None-Match"] = validators["etag"]
+    if validators.get("last_modified"): headers["If-Modified-Since"] = validators["last_modified"]
+
+    routes = []
+    if pool: routes.append(pool.pick())
+    routes.append(None)
+    for endpoint in routes:
+        url = proxy_url(endpoint, target_url) if endpoint else target_url
+        timeout = pool.timeout_for(endpoint) if endpoint else DIRECT_TIMEOUT
+        route_headers = dict(headers, **(pool.acquire() or {})) if endpoint else headers
+        start = time.time()
+        try:
+            res = session.get(url, headers=route_headers, timeout=timeout, stream=projection is not None)
+        except Exception:
+            if endpoint: pool.report(endpoint, False, time.time() - start, responded=False)
+            METRICS.record_request(target_url, "proxy" if endpoint else "direct", "error", time.time() - start, False)
+            continue
+        route = "proxy" if endpoint else "direct"
+        if res.status_code == 304 and headers:
+            if endpoint: pool.report(endpoint, True, time.time() - start)
+            METRICS.record_request(target_url, route, 304, time.time() - start, True)
+            return 304, None, validators
+        data = None
+        if res.status_code == 200:
+            try:
+                data = decode_response(res, projection)
+            except Exception: pass
+        else: res.close()
+        ok = data is not None and accept(data)
+        if endpoint: pool.report(endpoint, ok, time.time() - start)
+        METRICS.record_request(target_url, route, res.status_code, time.time() - start, ok)
+        if ok:
+            return 200, data, {"etag": res.headers.get("ETag"), "last_modified": res.headers.get("Last-Modified")}
+    return None, None, {}
+
+
+def _submit(fn, *args):
+    # Thread daemon thay cho ThreadPoolExecutor: route thua vẫn đang bay (requests không hủy được)
+    # không giữ interpreter lại 30-60s lúc job thoát
+    future = Future()
+
+    def run():
+        if not future.set_running_or_notify_cancel(): return
+        try: future.set_result(fn(*args))
+        except BaseException as e: future.set_exception(e)
+
+    threading.Thread(target=run, name="hedge", daemon=True).start()
+    return future
+
+
+def fetch_hedged(session, pool, endpoint, target_url, accept=_accept_any, projection=None):
+    """ Trả về (data, đã_thử_direct). Route phụ là proxy khác nếu có, không thì gọi thẳng. """
+    pool.hedge.requests += 1
+    # Xin quota lane trước khi bấm giờ hedge: thời gian bị throttle không được tính là proxy chậm
+    headers = pool.acquire()
+    primary = _submit(_proxy_get, session, pool, endpoint, target_url, accept, projection, headers)
+    done, _ = wait([primary], timeout=pool.hedge_delay())
+    if done: return primary.result(), False
+
+    alt_endpoint = pool.pick(exclude=(endpoint,)) if len(pool.endpoints) > 1 else None
+    if alt_endpoint is not None and alt_endpoint is not endpoint:
+        alternate = _submit(fetch_via_proxy, session, pool, alt_endpoint, target_url, accept, projection)
+    else:
+        alternate = _submit(fetch_direct, session, target_url, accept, projection)
+        alt_endpoint = None
+    pool.hedge.fired += 1
+
+    pending = {primary, alternate}
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for f in done:
+            data = f.result()
+            if data is not None:
+                if f is alternate: pool.hedge.won += 1
+                # requests không hủy được request đang bay -> bỏ mặc kết quả của route thua
+                for p in pending: p.cancel()
+                return data, alt_endpoint is None
+    return None, alt_endpoint is None
+
+
+def fetch_smart(session, pool, target_url, retries=3, accept=_accept_any, projection=None):
+    if not target_url: return None
+    last_failed = None
+    for i in range(retries):
+        if i: METRICS.record_retry(target_url)
+        tried_direct = False
+        if pool:
+            endpoint = pool.pick(exclude=(last_failed,) if last_failed else ())
+            if HEDGE_ENABLED:
+                data, tried_direct = fetch_hedged(session, pool, endpoint, target_url, accept, projection)
+            else:
+                data = fetch_via_proxy(session, pool, endpoint, target_url, accept, projection)
+            if data is not None: return data
+            last_failed = endpoint
+
+        if not tried_direct:
+            data = fetch_direct(session, target_url, accept, projection)
+        if data is not None: return data
+        time.sleep(1)
+    return None
+
+
+def fetch_batch_via_proxy(session, pool, endpoint, target_urls, accept=_accept_any, projection=None):
+    """ Hợp đồng batch: POST {"urls": [...]} -> {"results": [{"status": 200, "body": ...}, ...]} cùng thứ tự. """
+    headers = pool.acquire(len(target_urls))
+    start = time.time()
+    try:
+        res = session.post(endpoint.url, json={"urls": target_urls}, headers=headers, timeout=BATCH_TIMEOUT)
+    except Exception:
+        pool.report(endpoint, False, (time.time() - start) / len(target_urls), responded=False, sample=False)
+        for u in target_urls: METRICS.record_request(u, "proxy_batch", "error", time.time() - start, False)
+        return [None] * len(target_urls)
+
+    latency = time.time() - start
+    items = None
+    if res.status_code == 200:
+        try:
+            items = res.json().get("results")
+        except Exception: pass
+    if not isinstance(items, list) or len(items) != len(target_urls):
+        # Worker chưa nâng cấp -> đánh dấu để lần sau đi đường từng URL
+        if res.status_code in (200, 400, 404, 405): endpoint.batch = False
+        pool.report(endpoint, False, latency / len(target_urls), sample=False)
+        for u in target_urls: METRICS.record_request(u, "proxy_batch", res.status_code, latency, False)
+        return [None] * len(target_urls)
+
+    endpoint.batch = True
+    # EWMA của endpoint tính theo độ trễ / URL để endpoint hỗ trợ batch không bị hạ trọng số
+    pool.report(endpoint, True, latency / len(target_urls), sample=False)
+    out = []
+    for u, item in zip(target_urls, items):
+        body = item.get("body") if isinstance(item, dict) else None
+        if projection is not None: body = project(body, projection)
+        ok = isinstance(item, dict) and item.get("status") == 200 and accept(body)
+        METRICS.record_request(u, "proxy_batch", item.get("status") if isinstance(item, dict) else "error", latency, ok)
+        out.append(body if ok else None)
+    return out
+
+
+def fetch_many(session, pool, target_urls, retries=3, accept=_accept_any, projection=None):
+    results = [None] * len(target_urls)
+    pending = [i for i, u in enumerate(target_urls) if u]
+
+    batch_endpoints = [e for e in pool.endpoints if e.batch is not False] if pool else []
+    if BATCH_ENABLED and batch_endpoints and len(pending) > 1:
+        for n in range(0, len(pending), BATCH_MAX_URLS):
+            chunk = pending[n:n + BATCH_MAX_URLS]
+            endpoint = pool.pick(exclude=[e for e in pool.endpoints if e.batch is False])
+            if endpoint.batch is False: break
+            for i, data in zip(chunk, fetch_batch_via_proxy(session, pool, endpoint, [target_urls[i] for i in chunk], accept, projection)):
+                results[i] = data
+        pending = [i for i in pending if results[i] is None]
+
+    # Phần còn thiếu (batch lỗi / tắt batch) đi đường cũ từng URL
+    for i in pending:
+        results[i] = fetch_smart(session, pool, target_urls[i], retries=retries, accept=accept, projection=projection)
+    return results
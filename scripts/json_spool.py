@@ -0,0 +1,102 @@
+import json
+import shutil
+import tempfile
+
+# --- GHI JSON THEO LUỒNG RỒI UPLOAD ---
+# Thay cho json.dumps(...) -> .encode() -> put_object: từng record được encode rồi ghi ngay vào
+# SpooledTemporaryFile (RAM tới SPOOL_MAX_BYTES, quá thì tự tràn ra đĩa), sau đó upload_fileobj
+# đọc file theo từng part (multipart khi lớn). Bộ nhớ không còn tăng theo số token / kích thước file.
+SPOOL_MAX_BYTES = 8 * 1024 * 1024
+PART_SIZE = 8 * 1024 * 1024
+FLUSH_BYTES = 64 * 1024
+
+
+class JsonSpool:
+    def __init__(self, ensure_ascii=True, separators=(',', ':'), max_size=SPOOL_MAX_BYTES):
+        self.file = tempfile.SpooledTemporaryFile(max_size=max_size, mode="w+b")
+        self.encoder = json.JSONEncoder(ensure_ascii=ensure_ascii, separators=separators)
+        self.item_sep, self.key_sep = separators
+        self.size = 0
+        self._buf = []
+        self._buf_len = 0
+        self._first = []  # Mỗi object đang mở: đã có field nào chưa
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.file.close()
+
+    def write(self, text):
+        self._buf.append(text)
+        self._buf_len += len(text)
+        if self._buf_len >= FLUSH_BYTES: self.flush()
+
+    def flush(self):
+        if not self._buf: return
+        chunk = "".join(self._buf).encode('utf-8')
+        self.file.write(chunk)
+        self.size += len(chunk)
+        self._buf, self._buf_len = [], 0
+
+    def dump(self, obj):
+        self.write(self.encoder.encode(obj))
+
+    def dump_array(self, items):
+        """ items có thể là generator -> không bao giờ giữ cả list đã encode trong RAM """
+        self.write("[")
+        for i, item in enumerate(items):
+            if i: self.write(self.item_sep)
+            self.dump(item)
+        self.write("]")
+
+    def begin_object(self):
+        self.write("{")
+        self._first.append(True)
+
+    def field(self, key, *value):
+        """ Ghi "key": trong object đang mở; có value thì ghi luôn, không thì để caller ghi tiếp """
+        if not self._first[-1]: self.write(self.item_sep)
+        self._first[-1] = False
+        self.write(self.encoder.encode(str(key)) + self.key_sep)
+        if value: self.dump(value[0])
+
+    def end_object(self):
+        self.write("}")
+        self._first.pop()
+
+    def append(self, other):
+        """ Nối nguyên nội dung 1 spool khác vào cuối (copy theo chunk, không đọc hết vào RAM) """
+        self.flush()
+        other.flush()
+        other.file.seek(0)
+        shutil.copyfileobj(other.file, self.file)
+        self.size += other.size
+
+    def dump_object(self, fields):
+        """ Object 1 cấp: value là dict thì ghi từng cặp key/value, list/generator thì ghi từng phần tử """
+        self.begin_object()
+        for key, value in fields.items():
+            self.field(key)
+            if isinstance(value, dict):
+                self.begin_object()
+                for k, v in value.items(): self.field(k, v)
+                self.end_object()
+            elif isinstance(value, (str, bytes, int, float, bool)) or value is None:
+                self.dump(value)
+            else:
+                self.dump_array(value)
+        self.end_object()
+
+    def upload(self, r2_client, bucket, key, **extra_args):
+        from boto3.s3.transfer import TransferConfig
+        self.flush()
+        self.file.seek(0)
+        r2_client.upload_fileobj(
+            self.file, bucket, key, ExtraArgs=extra_args,
+            Config=TransferConfig(multipart_threshold=PART_SIZE, multipart_chunksize=PART_SIZE, use_threads=False)
+        )
+        return self.size
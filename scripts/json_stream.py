@@ -0,0 +1,114 @@
+try:
+    import ijson
+except ImportError:  # Không có ijson thì vẫn chạy được, chỉ mất phần tiết kiệm RAM
+    ijson = None
+
+_SCALAR_EVENTS = ("string", "number", "boolean", "null")
+
+
+# --- KHAI BÁO FIELD CẦN LẤY TỪ RESPONSE LỚN ---
+# Ví dụ:
+#   Projection(array="symbols", fields=("baseAsset", "status"))
+#   Projection(scalars=("code",), array="data.klineInfos", fields=(0, 4, 5))
+# Kết quả giữ nguyên hình dạng JSON gốc (dict lồng nhau) để code cũ vẫn đọc như trước.
+# Với mảng con (nến kline) các vị trí không lấy được điền None -> k[5] vẫn đúng chỉ số (không độn dài hơn nến gốc).
+class Projection:
+    def __init__(self, scalars=(), array=None, fields=()):
+        self.scalars = tuple(scalars)
+        self.array = array
+        self.fields = tuple(fields)
+        self.row_len = max(self.fields) + 1 if self.fields and isinstance(self.fields[0], int) else 0
+
+
+def _set_path(out, dotted, value):
+    keys = dotted.split(".")
+    node = out
+    for k in keys[:-1]:
+        node = node.setdefault(k, {})
+    node[keys[-1]] = value
+
+
+def _get_path(data, dotted):
+    node = data
+    for k in dotted.split("."):
+        if not isinstance(node, dict) or k not in node: return None, False
+        node = node[k]
+    return node, True
+
+
+def _project_item(item, proj):
+    if proj.row_len:
+        if not isinstance(item, list): return None
+        # Không độn dài hơn nến gốc -> các check len(k) > i của code cũ vẫn đúng
+        row = [None] * min(proj.row_len, len(item))
+        for i in proj.fields:
+            if i < len(item): row[i] = item[i]
+        return row
+    if not isinstance(item, dict): return None
+    return {k: item[k] for k in proj.fields if k in item}
+
+
+def project(data, proj):
+    """ Cắt gọn một document đã parse theo Projection (dùng cho batch / khi thiếu ijson). """
+    if not isinstance(data, dict): return data
+    out = {}
+    for key in proj.scalars:
+        value, found = _get_path(data, key)
+        if found: _set_path(out, key, value)
+    if proj.array:
+        items, found = _get_path(data, proj.array)
+        if found and isinstance(items, list):
+            _set_path(out, proj.array, [_project_item(it, proj) for it in items])
+    return out
+
+
+def parse_stream(fileobj, proj):
+    """ Parse tăng dần từ stream: chỉ dựng object cho field khai báo, bỏ qua filters/permissions... """
+    out = {}
+    rows = None
+    item_prefix = f"{proj.array}.item" if proj.array else None
+    elem_prefix = f"{item_prefix}.item"
+    row, idx, depth = None, 0, 0
+
+    for prefix, event, value in ijson.parse(fileobj, use_float=True):
+        if prefix == proj.array and event == "start_array":
+            rows = []
+            _set_path(out, proj.array, rows)
+        elif prefix == item_prefix and rows is not None and event != "map_key":
+            if event in ("start_map", "start_array"):
+                row = [None] * proj.row_len if proj.row_len else {}
+                idx, depth = 0, 0
+            elif event in ("end_map", "end_array"):
+                if proj.row_len: del row[idx:]
+                rows.append(row)
+                row = None
+            else:
+                rows.append(None)
+        elif row is not None and proj.row_len and prefix == elem_prefix:
+            # Phần tử của một nến: đếm vị trí, bỏ qua container lồng bên trong
+            if event in ("start_map", "start_array"):
+                if depth == 0: idx += 1
+                depth += 1
+            elif event in ("end_map", "end_array"):
+                depth -= 1
+            elif depth == 0:
+                if idx < proj.row_len and idx in proj.fields: row[idx] = value
+                idx += 1
+        elif row is not None and not proj.row_len and event in _SCALAR_EVENTS and prefix.startswith(item_prefix + "."):
+            key = prefix[len(item_prefix) + 1:]
+            if key in proj.fields: row[key] = value
+        elif prefix in proj.scalars and event in _SCALAR_EVENTS:
+            _set_path(out, prefix, value)
+    return out
+
+
+def decode_response(res, proj=None):
+    """ res phải được mở với stream=True nếu muốn parse tăng dần. """
+    if proj is None: return res.json()
+    if ijson is None or getattr(res, "raw", None) is None:
+        return project(res.json(), proj)
+    res.raw.decode_content = True  # Giải nén gzip/br ngay trên stream
+    try:
+        return parse_stream(res.raw, proj)
+    finally:
+        res.close()
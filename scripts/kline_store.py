@@ -0,0 +1,70 @@
+import json
+import time
+
+# --- KHO KLINE / TICKER DÙNG CHUNG GIỮA CÁC JOB ---
+# Mỗi job chỉ GHI object của riêng mình (tránh 2 job ghi đè lẫn nhau), job khác chỉ ĐỌC:
+#   shared/alpha-store.json       <- fetch_alpha: nến 1d (limit/aggregate) của token đang có giải, đọc bởi fetch_base_data
+#   shared/competition-store.json <- fetch_competition: nến 1h limit (tự đọc lại để chỉ lấy phần đuôi)
+#                                    + danh sách token đang có giải ("wanted") cho fetch_alpha
+# Mỗi series có mốc ts riêng để bên đọc tự quyết định còn tươi hay phải gọi upstream.
+ALPHA_STORE_KEY = "shared/alpha-store.json"
+COMPETITION_STORE_KEY = "shared/competition-store.json"
+MAX_SERIES_AGE = 3 * 86400  # Series không ai cập nhật quá lâu thì bỏ
+
+
+def token_key(chain_id, contract):
+    return f"{str(chain_id).strip()}:{str(contract or '').strip().lower()}"
+
+
+class KlineStore:
+    def __init__(self, data=None):
+        data = data or {}
+        self.series = data.get("series") or {}
+        self.wanted = set(data.get("wanted") or [])
+        self.updated_at = data.get("updated_at", 0)
+        self.dirty = False
+
+    @classmethod
+    def load_from_r2(cls, r2_client, bucket, key):
+        if not r2_client: return cls()
+        try:
+            obj = r2_client.get_object(Bucket=bucket, Key=key)
+            return cls(json.loads(obj['Body'].read().decode('utf-8')))
+        except Exception:
+            return cls()
+
+    def save_to_r2(self, r2_client, bucket, key):
+        if not r2_client or not self.dirty: return
+        self.prune()
+        self.updated_at = int(time.time() * 1000)
+        body = json.dumps({
+            "updated_at": self.updated_at, "wanted": sorted(self.wanted), "series": self.series
+        }, separators=(',', ':')).encode('utf-8')
+        try:
+            r2_client.put_object(Bucket=bucket, Key=key, Body=body, ContentType='application/json')
+            self.dirty = False
+        except Exception as e:
+            print(f"⚠️ Không lưu được {key}: {e}")
+
+    def prune(self, now=None):
+        cutoff = ((now or time.time()) - MAX_SERIES_AGE) * 1000
+        for tk in list(self.series):
+            entries = self.series[tk]
+            for name in [n for n, e in entries.items() if e.get("ts", 0) < cutoff]:
+                del entries[name]
+            if not entries: del self.series[tk]
+
+    def wants(self, chain_id, contract):
+        return token_key(chain_id, contract) in self.wanted
+
+    def get(self, chain_id, contract, name, fresh_since=0):
+        """ Trả về (rows, ts) nếu series có và được cập nhật sau fresh_since (ms), ngược lại (None, 0). """
+        entry = self.series.get(token_key(chain_id, contract), {}).get(name)
+        if not entry or entry.get("ts", 0) < fresh_since: return None, 0
+        return entry["rows"], entry["ts"]
+
+    def put(self, chain_id, contract, name, rows, ts=None):
+        self.series.setdefault(token_key(chain_id, contract), {})[name] = {
+            "ts": ts or int(time.time() * 1000), "rows": rows
+        }
+        self.dirty = True
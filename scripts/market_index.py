@@ -0,0 +1,60 @@
+import heapq
+import os
+
+# --- INDEX TÍNH SẴN CHO FRONTEND ---
+# Client không phải tải + sort cả market-data.json chỉ để vẽ trang chủ:
+# mỗi lần chạy fetch_alpha tính luôn top-N id theo từng chỉ số, tổng theo chain / status
+# và danh sách token có mul_point > 1, ghi ra market-index.json (vài KB).
+# Key ngắn giống market-data.json (dt, dl, r24, mc...). Id tra ngược trong market-data.json.
+INDEX_KEY = "market-index.json"
+TOP_N = int(os.getenv("MARKET_INDEX_TOP_N", "50"))
+
+# key -> (hàm lấy giá trị, lấy lớn nhất?)
+TOP_METRICS = {
+    "dt": (lambda r: r.daily_total, True),
+    "dl": (lambda r: r.daily_limit, True),
+    "r24": (lambda r: r.rolling_24h, True),
+    "mc": (lambda r: r.market_cap, True),
+    "h": (lambda r: r.holders, True),
+    "gain": (lambda r: r.change_24h, True),
+    "lose": (lambda r: r.change_24h, False),
+}
+
+
+def _empty_group():
+    return {"n": 0, "dt": 0, "dl": 0, "do": 0, "r24": 0, "mc": 0, "mp": 0}
+
+
+def _add(group, r):
+    group["n"] += 1
+    group["dt"] += int(r.daily_total)
+    group["dl"] += int(r.daily_limit)
+    group["do"] += int(r.daily_onchain)
+    group["r24"] += int(r.rolling_24h)
+    group["mc"] += r.market_cap
+    if r.mul_point > 1: group["mp"] += 1
+
+
+def build_market_index(records, updated_at, top_n=TOP_N):
+    by_chain, by_status = {}, {}
+    for r in records:
+        _add(by_chain.setdefault(r.chain or "?", _empty_group()), r)
+        _add(by_status.setdefault(r.status or "?", _empty_group()), r)
+
+    # Bảng xếp hạng chỉ tính token còn giao dịch (không offline)
+    ranked = [r for r in records if not r.offline]
+    top = {}
+    for key, (value, largest) in TOP_METRICS.items():
+        pick = heapq.nlargest if largest else heapq.nsmallest
+        top[key] = [r.id for r in pick(top_n, ranked, key=value)]
+
+    mul_point = sorted((r for r in ranked if r.mul_point > 1), key=lambda r: r.mul_point, reverse=True)
+
+    return {
+        "u": updated_at,
+        "t": len(records),
+        "top": top,
+        "mp": [[r.id, r.mul_point] for r in mul_point],
+        "chain": by_chain,
+        "status": by_status,
+    }
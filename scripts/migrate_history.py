@@ -1,9 +1,11 @@
 import os
-import json
 import boto3
 from datetime import datetime, timezone
 from botocore.config import Config
 from supabase import create_client
+from run_metrics import METRICS
+import profiling
+from json_spool import JsonSpool
 
 # --- CẤU HÌNH ---
 SUPABASE_URL = os.environ.get("SUPABASE_URL")
@@ -25,7 +27,8 @@ s3 = boto3.client('s3', endpoint_url=R2_ENDPOINT,
 def main():
     print(">>> BẮT ĐẦU MIGRATION HISTORY (ĐÃ FIX LOGIC TIME & KEY) <<<")
 
-    response = supabase.table("tournaments").select("*").neq('id', -1).execute()
+    with METRICS.phase("load_tournaments"):
+        response = supabase.table("tournaments").select("*").neq('id', -1).execute()
     all_tournaments = response.data
     print(f"-> Tổng số bản ghi trong DB: {len(all_tournaments)}")
 
@@ -107,6 +110,7 @@ def main():
             print(f"❌ Lỗi record ID {record.get('id')}: {e}")
 
     total_migrated = count_standard + count_legacy
+    METRICS.set("migrated", total_migrated)
     print("------------------------------------------------")
     print(f"✅ KẾT QUẢ QUÉT:")
     print(f"   - Giải chuẩn (Có AlphaID): {count_standard}")
@@ -117,15 +121,16 @@ def main():
     if total_migrated > 0:
         file_key = "finalized_history.json"
         print(f"-> Đang upload '{file_key}' lên R2...")
-        s3.put_object(
-            Bucket=R2_BUCKET,
-            Key=file_key,
-            Body=json.dumps(history_map),
-            ContentType='application/json'
-        )
+        with METRICS.phase("upload"), JsonSpool(separators=(', ', ': ')) as spool:
+            with profiling.timed("json_dumps"):
+                spool.dump_object(history_map)
+            size = spool.upload(s3, R2_BUCKET, file_key, ContentType='application/json')
+        METRICS.record_output(file_key, size)
         print("🎉 UPLOAD THÀNH CÔNG! R2 ĐÃ CÓ DATA ĐẦY ĐỦ VÀ CHUẨN XÁC.")
     else:
         print("⚠️ Không tìm thấy dữ liệu history nào.")
 
 if __name__ == "__main__":
-    main()
+    METRICS.start("migrate_history")
+    try: profiling.run(main, "migrate_history")
+    finally: METRICS.emit(s3, R2_BUCKET)
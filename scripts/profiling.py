@@ -0,0 +1,120 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import sys
+import time
+import tracemalloc
+from contextlib import nullcontext
+
+# --- PROFILE THEO YÊU CẦU ---
+# Bật bằng `--profile` hoặc PROFILE=1. Khi tắt: decorator trả lại nguyên hàm gốc,
+# context manager là nullcontext dùng chung -> không tốn gì trên hot path.
+# Khi bật: cProfile cả hàm main, tracemalloc quanh các phase nặng, đo thời gian hàm nóng.
+# Kết quả ghi vào PROFILE_DIR (mặc định profile-output/): <job>.pstats, <job>-pstats.txt,
+# <job>-<phase>-alloc.txt, <job>-hot.json.
+PROFILE_ENABLED = os.getenv("PROFILE", "0") == "1" or "--profile" in sys.argv
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profile-output")
+TOP_ALLOCATIONS = 25
+TOP_FUNCTIONS = 40
+
+_NULL = nullcontext()
+HOT_STATS = {}
+_job = "job"
+
+
+def _record(name, elapsed):
+    stat = HOT_STATS.get(name)
+    if stat is None:
+        stat = HOT_STATS[name] = {"calls": 0, "total_s": 0.0, "max_s": 0.0}
+    stat["calls"] += 1
+    stat["total_s"] += elapsed
+    if elapsed > stat["max_s"]: stat["max_s"] = elapsed
+
+
+def hot(name=None):
+    def decorator(fn):
+        if not PROFILE_ENABLED: return fn
+        label = name or fn.__name__
+
+        def wrapper(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                _record(label, time.perf_counter() - t0)
+
+        wrapper.__name__ = fn.__name__
+        wrapper.__doc__ = fn.__doc__
+        wrapper.__wrapped__ = fn
+        return wrapper
+    return decorator
+
+
+class _Timed:
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+
+    def __exit__(self, *exc):
+        _record(self.name, time.perf_counter() - self.t0)
+
+
+def timed(name):
+    return _Timed(name) if PROFILE_ENABLED else _NULL
+
+
+class _Snapshot:
+    def __init__(self, label):
+        self.label = label
+
+    def __enter__(self):
+        # Chỉ bật tracemalloc trong phase được đo, tránh làm chậm cả job
+        self.started = not tracemalloc.is_tracing()
+        if self.started: tracemalloc.start(10)
+        tracemalloc.reset_peak()
+        self.before = tracemalloc.take_snapshot()
+
+    def __exit__(self, *exc):
+        after = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        diff = after.compare_to(self.before, "lineno")
+        lines = [f"# {_job} / {self.label}: current={current/1e6:.2f}MB peak={peak/1e6:.2f}MB", ""]
+        lines += [str(stat) for stat in diff[:TOP_ALLOCATIONS]]
+        _write(f"{_job}-{self.label}-alloc.txt", "\n".join(lines) + "\n")
+        if self.started: tracemalloc.stop()
+
+
+def snapshot(label):
+    return _Snapshot(label) if PROFILE_ENABLED else _NULL
+
+
+def _write(name, text):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    with open(os.path.join(PROFILE_DIR, name), "w") as f:
+        f.write(text)
+
+
+def run(main, job):
+    global _job
+    if not PROFILE_ENABLED: return main()
+
+    _job = job
+    print(f"🔬 Profiling bật -> {PROFILE_DIR}/")
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        return main()
+    finally:
+        profiler.disable()
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        profiler.dump_stats(os.path.join(PROFILE_DIR, f"{job}.pstats"))
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+        _write(f"{job}-pstats.txt", out.getvalue())
+        hot_stats = {k: {"calls": v["calls"], "total_s": round(v["total_s"], 4), "max_s": round(v["max_s"], 4)}
+                     for k, v in HOT_STATS.items()}
+        _write(f"{job}-hot.json", json.dumps(hot_stats, indent=2))
@@ -0,0 +1,86 @@
+import argparse
+import json
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# --- WORKER GIẢ LẬP CHẠY LOCAL ---
+# Cài đặt đúng hợp đồng của PROXY_WORKER_URL để test fetch_layer mà không cần Cloudflare/Render:
+#   GET  /?url=<encoded>           -> trả nguyên status + body của upstream
+#   POST / {"urls": [...]}         -> {"results": [{"status": 200, "body": <json|null>}, ...]} đúng thứ tự
+# Chạy: python scripts/proxy_worker_stub.py --port 8787  rồi đặt PROXY_WORKER_URL=http://127.0.0.1:8787
+
+UPSTREAM_TIMEOUT = 15
+BATCH_CONCURRENCY = 8
+
+
+def fetch_upstream(url):
+    req = urllib.request.Request(url, headers={"User-Agent": "Mozilla/5.0", "Accept": "application/json"})
+    try:
+        with urllib.request.urlopen(req, timeout=UPSTREAM_TIMEOUT) as res:
+            return res.status, res.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.read()
+    except Exception as e:
+        return 502, json.dumps({"error": str(e)}).encode("utf-8")
+
+
+def decode_body(raw):
+    try: return json.loads(raw)
+    except Exception: return None
+
+
+def make_handler(upstream=fetch_upstream):
+    class ProxyWorkerHandler(BaseHTTPRequestHandler):
+        def _send(self, status, body):
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            query = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+            target = (query.get("url") or [None])[0]
+            if not target:
+                # Ping đánh thức (warm-up) không kèm url
+                return self._send(200, b'{"ok":true}')
+            status, body = upstream(target)
+            self._send(status, body)
+
+        def do_POST(self):
+            try:
+                length = int(self.headers.get("Content-Length") or 0)
+                urls = json.loads(self.rfile.read(length)).get("urls")
+                if not isinstance(urls, list): raise ValueError("urls must be a list")
+            except Exception as e:
+                return self._send(400, json.dumps({"error": str(e)}).encode("utf-8"))
+
+            with ThreadPoolExecutor(max_workers=BATCH_CONCURRENCY) as ex:
+                responses = list(ex.map(upstream, urls))
+            results = [{"status": status, "body": decode_body(body)} for status, body in responses]
+            self._send(200, json.dumps({"results": results}, separators=(',', ':')).encode("utf-8"))
+
+        def log_message(self, format, *args):
+            pass
+
+    return ProxyWorkerHandler
+
+
+def serve(host="127.0.0.1", port=8787, upstream=fetch_upstream):
+    server = ThreadingHTTPServer((host, port), make_handler(upstream))
+    server.daemon_threads = True
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for the proxy worker (GET ?url= and POST batch)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8787)
+    args = parser.parse_args()
+    server = serve(args.host, args.port)
+    print(f"🧪 Proxy worker stub: http://{args.host}:{server.server_address[1]}")
+    try: server.serve_forever()
+    except KeyboardInterrupt: pass
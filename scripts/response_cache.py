@@ -0,0 +1,74 @@
+import json
+import time
+
+# --- CACHE KẾT QUẢ CHO CÁC ENDPOINT ÍT THAY ĐỔI ---
+# Lưu kết quả ĐÃ XỬ LÝ (vd: set baseAsset đang TRADING) chứ không lưu nguyên body.
+# ttl: còn tươi thì dùng luôn, không gọi mạng.
+# max_stale: quá hạn này thì xóa hẳn (kể cả khi upstream lỗi cũng không dùng bản cũ nữa).
+CACHE_KEY = "cache/response-cache.json"
+CACHE_POLICIES = {
+    # Token offline không có trong set lấy từ cache -> fetch_alpha revalidate lại trước khi đánh PRE_DELISTED
+    "spot_symbols": {"ttl": 6 * 3600, "max_stale": 3 * 86400},
+}
+
+
+class ResponseCache:
+    def __init__(self, entries=None, policies=None):
+        self.policies = policies or CACHE_POLICIES
+        self.entries = entries or {}
+        self.dirty = False
+        self.evict()
+
+    @classmethod
+    def load_from_r2(cls, r2_client, bucket, key=CACHE_KEY):
+        if not r2_client: return cls()
+        try:
+            obj = r2_client.get_object(Bucket=bucket, Key=key)
+            return cls(json.loads(obj['Body'].read().decode('utf-8')))
+        except Exception:
+            return cls()
+
+    def save_to_r2(self, r2_client, bucket, key=CACHE_KEY):
+        if not r2_client or not self.dirty: return
+        try:
+            r2_client.put_object(
+                Bucket=bucket, Key=key,
+                Body=json.dumps(self.entries, separators=(',', ':')).encode('utf-8'),
+                ContentType='application/json'
+            )
+            self.dirty = False
+        except Exception as e:
+            print(f"⚠️ Không lưu được response cache: {e}")
+
+    def evict(self, now=None):
+        now = now or time.time()
+        for name in list(self.entries):
+            policy = self.policies.get(name)
+            entry = self.entries[name]
+            if not policy or not isinstance(entry, dict) or now - entry.get("ts", 0) > policy["max_stale"]:
+                del self.entries[name]
+                self.dirty = True
+
+    def get_fresh(self, name):
+        entry = self.entries.get(name)
+        if entry and time.time() - entry["ts"] <= self.policies[name]["ttl"]:
+            return entry["value"]
+        return None
+
+    def get_stale(self, name):
+        entry = self.entries.get(name)
+        return entry["value"] if entry else None
+
+    def validators(self, name):
+        entry = self.entries.get(name) or {}
+        return {k: entry[k] for k in ("etag", "last_modified") if entry.get(k)}
+
+    def put(self, name, value, etag=None, last_modified=None):
+        self.entries[name] = {"ts": time.time(), "value": value, "etag": etag, "last_modified": last_modified}
+        self.dirty = True
+
+    def touch(self, name):
+        # Upstream trả 304 -> giữ value, làm mới mốc TTL
+        if name in self.entries:
+            self.entries[name]["ts"] = time.time()
+            self.dirty = True
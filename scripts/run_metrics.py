@@ -0,0 +1,147 @@
+import json
+import os
+import threading
+import time
+import urllib.parse
+from contextlib import contextmanager
+
+# --- ĐO ĐẠC MỖI LẦN CHẠY JOB ---
+# Thời gian từng phase, histogram request theo host (latency / status / proxy vs direct / retry),
+# số byte output. Cuối job ghi run-reports/<job>.json lên R2, và file Prometheus nếu có METRICS_TEXTFILE.
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+REPORT_PREFIX = "run-reports"
+
+
+def _host(url):
+    try: return urllib.parse.urlparse(url).netloc or "unknown"
+    except Exception: return "unknown"
+
+
+class RunMetrics:
+    def __init__(self, job="unknown"):
+        self.job = job
+        self.started = time.time()
+        self.phases = {}
+        self.hosts = {}
+        self.outputs = {}
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def start(self, job):
+        self.__init__(job)
+
+    @contextmanager
+    def phase(self, name):
+        t0 = time.time()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.phases[name] = round(self.phases.get(name, 0.0) + time.time() - t0, 3)
+
+    def _host_stats(self, host):
+        stats = self.hosts.get(host)
+        if stats is None:
+            stats = self.hosts[host] = {"retries": 0, "routes": {}}
+        return stats
+
+    def record_request(self, url, route, status, latency, ok):
+        with self._lock:
+            routes = self._host_stats(_host(url))["routes"]
+            r = routes.get(route)
+            if r is None:
+                r = routes[route] = {"ok": 0, "fail": 0, "status": {}, "sum": 0.0,
+                                     "buckets": [0] * (len(LATENCY_BUCKETS) + 1)}
+            r["ok" if ok else "fail"] += 1
+            key = str(status)
+            r["status"][key] = r["status"].get(key, 0) + 1
+            r["sum"] += latency
+            for i, le in enumerate(LATENCY_BUCKETS):
+                if latency <= le:
+                    r["buckets"][i] += 1
+                    break
+            else:
+                r["buckets"][-1] += 1
+
+    def record_retry(self, url):
+        with self._lock:
+            self._host_stats(_host(url))["retries"] += 1
+
+    def record_output(self, key, nbytes):
+        with self._lock:
+            self.outputs[key] = self.outputs.get(key, 0) + nbytes
+
+    def set(self, name, value):
+        self.values[name] = value
+
+    def report(self):
+        with self._lock:
+            hosts = {}
+            for host, h in self.hosts.items():
+                routes = {}
+                for route, r in h["routes"].items():
+                    routes[route] = dict(r, sum=round(r["sum"], 3))
+                hosts[host] = {"retries": h["retries"], "routes": routes}
+            return {
+                "job": self.job,
+                "started_at": int(self.started * 1000),
+                "total_s": round(time.time() - self.started, 3),
+                "phases": dict(self.phases),
+                "hosts": hosts,
+                "buckets": list(LATENCY_BUCKETS),
+                "outputs": dict(self.outputs),
+                "values": dict(self.values),
+            }
+
+    def prometheus(self, report=None):
+        rep = report or self.report()
+        job = rep["job"]
+        lines = [
+            "# TYPE fetcher_run_seconds gauge",
+            f'fetcher_run_seconds{{job="{job}"}} {rep["total_s"]}',
+            "# TYPE fetcher_phase_seconds gauge",
+        ]
+        lines += [f'fetcher_phase_seconds{{job="{job}",phase="{p}"}} {s}' for p, s in rep["phases"].items()]
+        lines += ["# TYPE fetcher_requests_total counter"]
+        hist = ["# TYPE fetcher_request_latency_seconds histogram"]
+        retries = ["# TYPE fetcher_retries_total counter"]
+        for host, h in rep["hosts"].items():
+            retries.append(f'fetcher_retries_total{{job="{job}",host="{host}"}} {h["retries"]}')
+            for route, r in h["routes"].items():
+                labels = f'job="{job}",host="{host}",route="{route}"'
+                for status, n in r["status"].items():
+                    lines.append(f'fetcher_requests_total{{{labels},status="{status}"}} {n}')
+                cumulative = 0
+                for le, n in zip(list(LATENCY_BUCKETS) + ["+Inf"], r["buckets"]):
+                    cumulative += n
+                    hist.append(f'fetcher_request_latency_seconds_bucket{{{labels},le="{le}"}} {cumulative}')
+                hist.append(f'fetcher_request_latency_seconds_sum{{{labels}}} {r["sum"]}')
+                hist.append(f'fetcher_request_latency_seconds_count{{{labels}}} {cumulative}')
+        lines += hist + retries + ["# TYPE fetcher_output_bytes gauge"]
+        lines += [f'fetcher_output_bytes{{job="{job}",key="{k}"}} {n}' for k, n in rep["outputs"].items()]
+        return "\n".join(lines) + "\n"
+
+    def emit(self, r2_client=None, bucket=None):
+        rep = self.report()
+        body = json.dumps(rep, separators=(',', ':')).encode('utf-8')
+        if r2_client and bucket:
+            try:
+                r2_client.put_object(Bucket=bucket, Key=f"{REPORT_PREFIX}/{self.job}.json", Body=body,
+                                     ContentType='application/json', CacheControl='no-cache')
+            except Exception as e: print(f"⚠️ Không upload được run-report: {e}")
+
+        textfile = os.getenv("METRICS_TEXTFILE")
+        if textfile:
+            try:
+                tmp = f"{textfile}.tmp"
+                with open(tmp, "w") as f: f.write(self.prometheus(rep))
+                os.replace(tmp, textfile)
+            except Exception as e: print(f"⚠️ Không ghi được {textfile}: {e}")
+
+        phases = " ".join(f"{p}={s:.1f}s" for p, s in rep["phases"].items())
+        print(f"📈 Run report [{self.job}]: {rep['total_s']:.1f}s | {phases}")
+        return rep
+
+
+# Một instance dùng chung cho cả fetch_layer lẫn script đang chạy
+METRICS = RunMetrics()
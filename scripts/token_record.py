@@ -0,0 +1,129 @@
+import profiling
+
+# --- BẢN GHI TOKEN GỌN NHẸ ---
+# Mỗi token chỉ là 1 object __slots__ (không có __dict__, không có dict "volume" lồng),
+# được điền 1 lần từ item ticker và ghi thẳng ra format rút gọn (KEY_MAP) khi upload.
+
+KEY_MAP = {
+    "id": "i", "symbol": "s", "name": "n", "icon": "ic",
+    "chain": "cn", "chain_icon": "ci", "contract": "ct",
+    "status": "st", "price": "p", "change_24h": "c",
+    "market_cap": "mc", "liquidity": "l", "volume": "v",
+    "holders": "h",
+    "rolling_24h": "r24", "daily_total": "dt",
+    "daily_limit": "dl", "daily_onchain": "do",
+    "chart": "ch", "listing_time": "lt", "tx_count": "tx",
+    "offline": "off", "listingCex": "cex",
+    "onlineTge": "tge",
+    "onlineAirdrop": "air",
+    "mul_point": "mp"
+}
+
+def safe_float(v):
+    try: return float(v) if v else 0.0
+    except: return 0.0
+
+
+class TokenRecord:
+    __slots__ = (
+        "id", "symbol", "name", "icon", "chain", "chain_icon", "contract",
+        "status", "price", "change_24h", "mul_point",
+        "market_cap", "holders", "liquidity", "tx_count",
+        "listing_time", "offline", "listing_cex", "online_tge", "online_airdrop",
+        "rolling_24h", "daily_total", "daily_limit", "daily_onchain", "chart"
+    )
+
+    @classmethod
+    def from_ticker(cls, item, status, rolling_24h, daily_total, daily_limit, daily_onchain, chart):
+        r = cls()
+        r.id = item.get("alphaId")
+        r.symbol = item.get("symbol")
+        r.name = item.get("name")
+        r.icon = item.get("iconUrl")
+        r.chain = item.get("chainName", "")
+        r.chain_icon = item.get("chainIconUrl")
+        r.contract = item.get("contractAddress")
+        r.status = status
+        r.price = safe_float(item.get("price"))
+        r.change_24h = safe_float(item.get("percentChange24h"))
+        r.mul_point = safe_float(item.get("mulPoint"))
+        r.market_cap = int(safe_float(item.get("marketCap")))
+        r.holders = int(safe_float(item.get("holders")))
+        r.liquidity = int(safe_float(item.get("liquidity")))
+        r.tx_count = int(safe_float(item.get("count24h")))
+        r.listing_time = item.get("listingTime", 0)
+        r.offline = 1 if item.get("offline", False) else 0
+        r.listing_cex = 1 if item.get("listingCex", False) else 0
+        r.online_tge = 1 if item.get("onlineTge", False) else 0
+        r.online_airdrop = 1 if item.get("onlineAirdrop", False) else 0
+        r.rolling_24h = rolling_24h
+        r.daily_total = daily_total
+        r.daily_limit = daily_limit
+        r.daily_onchain = daily_onchain
+        r.chart = chart
+        return r
+
+    def sort_key(self):
+        return self.daily_total
+
+    def to_wire(self):
+        # Thứ tự key giữ y hệt minify_token_data cũ -> market-data.json không đổi 1 byte
+        return {
+            "i": self.id, "s": self.symbol, "n": self.name, "ic": self.icon,
+            "cn": self.chain, "ci": self.chain_icon, "ct": self.contract,
+            "st": self.status, "p": self.price, "c": self.change_24h, "mp": self.mul_point,
+            "mc": self.market_cap, "h": self.holders, "l": self.liquidity, "tx": self.tx_count,
+            "lt": self.listing_time, "off": self.offline, "cex": self.listing_cex,
+            "tge": self.online_tge, "air": self.online_airdrop,
+            "v": {
+                "r24": int(self.rolling_24h), "dt": int(self.daily_total),
+                "dl": int(self.daily_limit), "do": int(self.daily_onchain)
+            },
+            "ch": self.chart
+        }
+
+
+@profiling.hot("minify_token_data")
+def minify_token_data(token):
+    if isinstance(token, TokenRecord): return token.to_wire()
+    return _minify_verbose_dict(token)
+
+# Đường cũ: dict dài (id/symbol/volume{...}) -> dict rút gọn. Giữ lại để so sánh/benchmark.
+def _minify_verbose_dict(token):
+    minified = {}
+    minified[KEY_MAP["id"]] = token.get("id")
+    minified[KEY_MAP["symbol"]] = token.get("symbol")
+    minified[KEY_MAP["name"]] = token.get("name")
+    minified[KEY_MAP["icon"]] = token.get("icon")
+    
+    minified[KEY_MAP["chain"]] = token.get("chain")
+    minified[KEY_MAP["chain_icon"]] = token.get("chain_icon")
+    minified[KEY_MAP["contract"]] = token.get("contract")
+
+    minified[KEY_MAP["status"]] = token.get("status")
+    minified[KEY_MAP["price"]] = token.get("price")
+    minified[KEY_MAP["change_24h"]] = token.get("change_24h")
+    minified[KEY_MAP["mul_point"]] = token.get("mul_point")
+
+    minified[KEY_MAP["market_cap"]] = int(token.get("market_cap", 0))
+    minified[KEY_MAP["holders"]] = int(token.get("holders", 0))
+    minified[KEY_MAP["liquidity"]] = int(token.get("liquidity", 0))
+    minified[KEY_MAP["tx_count"]] = int(token.get("tx_count", 0))
+    
+    minified[KEY_MAP["listing_time"]] = token.get("listing_time")
+    minified[KEY_MAP["offline"]] = 1 if token.get("offline") else 0
+    minified[KEY_MAP["listingCex"]] = 1 if token.get("listingCex") else 0
+    minified[KEY_MAP["onlineTge"]] = 1 if token.get("onlineTge") else 0
+    minified[KEY_MAP["onlineAirdrop"]] = 1 if token.get("onlineAirdrop") else 0
+
+    vol = token.get("volume", {})
+    minified[KEY_MAP["volume"]] = {
+        KEY_MAP["rolling_24h"]: int(vol.get("rolling_24h", 0)),
+        KEY_MAP["daily_total"]: int(vol.get("daily_total", 0)),
+        KEY_MAP["daily_limit"]: int(vol.get("daily_limit", 0)),
+        KEY_MAP["daily_onchain"]: int(vol.get("daily_onchain", 0))
+    }
+    
+    minified[KEY_MAP["chart"]] = token.get("chart", [])
+    
+    return minified
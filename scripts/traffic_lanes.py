@@ -0,0 +1,121 @@
+import json
+import os
+import threading
+import time
+
+# --- LANE ƯU TIÊN CHO PROXY DÙNG CHUNG ---
+# 3 job cùng bắn qua PROXY_WORKER_URL. Mỗi lane có phần quota giữ riêng (token bucket, req/s):
+#   realtime (fetch_competition, 6 phút/lần) > market (fetch_alpha) > bulk (tails, fetch_base_data)
+# Job đang chạy ghi heartbeat lanes/<lane>/<job>.json lên R2 (mỗi job 1 key -> job này báo xong không xóa
+# tín hiệu bận của job khác cùng lane); lane thấp thấy lane cao đang bận thì chỉ chạy trong phần quota
+# của mình, lane cao thì mượn luôn phần của các lane đang rảnh.
+# PROXY_LANE_RPS=0 -> tắt hẳn (không giới hạn, không heartbeat).
+LANES = ("realtime", "market", "bulk")  # Thứ tự = độ ưu tiên
+LANE_SHARES = {"realtime": 0.5, "market": 0.3, "bulk": 0.2}
+LANE_JOBS = {
+    "realtime": ("competition",),
+    "market": ("alpha",),
+    "bulk": ("alpha-tails", "base_data"),
+}
+LANE_RPS = float(os.getenv("PROXY_LANE_RPS", "10"))
+HEARTBEAT_PREFIX = "lanes"
+HEARTBEAT_INTERVAL = 60
+HEARTBEAT_TTL = 2 * HEARTBEAT_INTERVAL
+POLL_INTERVAL = 15
+MAX_SLEEP = 1.0
+
+
+class TrafficLane:
+    def __init__(self, name, job, r2_client=None, bucket=None, total_rps=LANE_RPS):
+        if job not in LANE_JOBS.get(name, ()): raise ValueError(f"Job {job} không thuộc lane {name}")
+        self.name = name
+        self.priority = LANES.index(name)
+        self.r2 = r2_client
+        self.bucket = bucket
+        self.total_rps = total_rps
+        self.job = job
+        self.headers = {"X-Priority": name}
+        self.busy = set()  # Lane khác đang có heartbeat còn hạn
+        self.rate = total_rps
+        self.tokens = 1.0
+        self.requests = 0
+        self.waited = 0.0
+        self._refill_at = time.time()
+        self._beat_at = 0
+        self._poll_at = 0
+        self._lock = threading.Lock()
+
+    def enabled(self):
+        return self.total_rps > 0
+
+    def current_rate(self):
+        higher_busy = any(LANES.index(l) < self.priority for l in self.busy)
+        if higher_busy: return self.total_rps * LANE_SHARES[self.name]
+        # Không ai ưu tiên hơn đang chạy -> lấy hết, trừ phần giữ chỗ cho lane thấp đang bận
+        return self.total_rps * (1 - sum(LANE_SHARES[l] for l in self.busy if LANES.index(l) > self.priority))
+
+    def _heartbeat(self, now, expires=None):
+        body = json.dumps({"lane": self.name, "job": self.job, "at": int(now),
+                           "expires": int(now + HEARTBEAT_TTL if expires is None else expires)})
+        try:
+            self.r2.put_object(Bucket=self.bucket, Key=f"{HEARTBEAT_PREFIX}/{self.name}/{self.job}.json",
+                               Body=body.encode('utf-8'), ContentType='application/json')
+        except Exception as e: print(f"⚠️ Không ghi được heartbeat lane {self.name}: {e}")
+
+    def _poll(self, now):
+        busy = set()
+        for lane in LANES:
+            if lane == self.name: continue
+            for job in LANE_JOBS[lane]:
+                try:
+                    obj = self.r2.get_object(Bucket=self.bucket, Key=f"{HEARTBEAT_PREFIX}/{lane}/{job}.json")
+                    if json.loads(obj['Body'].read().decode('utf-8')).get("expires", 0) > now: busy.add(lane)
+                except Exception: pass
+        return busy
+
+    def _sync(self, now):
+        # Gọi lười trong acquire: job không còn gửi request thì heartbeat tự hết hạn.
+        # Chỉ giữ lock lúc quyết định / cập nhật state, GET/PUT R2 chạy ngoài lock (không chặn thread hedge).
+        if not self.r2: return
+        with self._lock:
+            beat = now - self._beat_at >= HEARTBEAT_INTERVAL
+            poll = now - self._poll_at >= POLL_INTERVAL
+            if beat: self._beat_at = now
+            if poll: self._poll_at = now
+        if beat: self._heartbeat(now)
+        if not poll: return
+        busy = self._poll(now)
+        with self._lock:
+            if busy != self.busy:
+                print(f"\n🚦 Lane {self.name}: lane bận = {sorted(busy) or '-'}")
+            self.busy = busy
+            self.rate = self.current_rate()
+
+    def acquire(self, n=1):
+        """ Trừ đủ n request vào bucket (được phép âm, batch cũng tính từng URL) rồi ngủ trả hết nợ.
+            Trả về header gửi kèm cho worker. """
+        if not self.enabled(): return self.headers
+        start = time.time()
+        self._sync(start)
+        with self._lock:
+            self.requests += n
+            now = time.time()
+            self.tokens = min(self.tokens + (now - self._refill_at) * self.rate, max(self.rate, 1.0))
+            self._refill_at = now
+            self.tokens -= n
+            deadline = now + max(-self.tokens, 0) / self.rate
+        while True:
+            left = deadline - time.time()
+            if left <= 0: break
+            time.sleep(min(left, MAX_SLEEP))
+            self._sync(time.time())
+        with self._lock:
+            self.waited += time.time() - start
+        return self.headers
+
+    def close(self):
+        # Báo xong sớm để lane thấp không phải chờ heartbeat hết hạn
+        if self.r2 and self._beat_at:
+            self._heartbeat(time.time(), expires=0)
+        return {"lane": self.name, "requests": self.requests, "wait_s": round(self.waited, 3),
+                "rate": round(self.rate, 2), "busy": sorted(self.busy)}